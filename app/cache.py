@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from app import config
+from app.db import thread_connections
+from app.tokens import UsageLedger, current_usage, start_usage
+
+
+class _Miss:
+    pass
+
+
+MISS = _Miss()
+
+
+class ResultCache:
+    """Base class for result caches. Values must be JSON serializable."""
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        value = self._get(key)
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._set(key, json.dumps(value))
+
+    # For the event loop. The in-memory caches answer right away.
+    async def get_async(self, key: str) -> Any:
+        return self.get(key)
+
+    async def set_async(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": self.size(),
+        }
+
+    def _get(self, key: str) -> Any:
+        return MISS
+
+    def _set(self, key: str, value: str) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+
+class MemoryCache(ResultCache):
+    """In-process LRU cache with a max number of entries and a TTL."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, value = entry
+        if expires_at and expires_at < time.time():
+            del self._entries[key]
+            return MISS
+        self._entries.move_to_end(key)
+        return json.loads(value)
+
+    def _set(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else 0
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ResultCache):
+    """On-disk cache in a SQLite file, shared by every worker on the host."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, ttl: float = 0):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self._connect = thread_connections(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _get(self, key: str) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at = 0 OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return MISS if row is None else json.loads(row[0])
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else 0
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at != 0 AND expires_at < ?", (now,))
+
+    # A write lock held by another process can keep a call waiting up to the
+    # 30 s busy timeout, which must not freeze the event loop
+    async def get_async(self, key: str) -> Any:
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_cache() -> ResultCache:
+    global _cache
+    if _cache is None:
+        if config.CACHE_BACKEND == "sqlite":
+            _cache = SQLiteCache(config.CACHE_SQLITE_PATH, ttl=config.CACHE_TTL_SECONDS)
+        elif config.CACHE_BACKEND == "memory":
+            _cache = MemoryCache(config.CACHE_MAX_ENTRIES, ttl=config.CACHE_TTL_SECONDS)
+        else:
+            _cache = ResultCache()
+    return _cache
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts
+    the call in its own task and every caller, the first one included,
+    awaits its result. A caller that is cancelled (a client that went away,
+    a section timeout) leaves the others waiting; the call is only cancelled
+    when its last caller is gone.
+
+    The call records its token usage in a ledger of its own, added to the
+    ledger of every request that gets its result, so each request's
+    meta.usage shows what its answers cost (joined sections are marked
+    coalesced). The call is queued at the priority of the request that
+    started it.
+    """
+
+    def __init__(self):
+        # key -> [shared task, callers waiting for it]
+        self._in_flight: dict[str, list] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, make_call) -> Any:
+        entry = self._in_flight.get(key)
+        joined = entry is not None
+        if joined:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(self._call(make_call))
+            entry = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._finished(key, entry, done))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            result, usage = await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not task.done():
+                # Nobody wants the result anymore
+                self._forget(key, entry)
+                task.cancel()
+        ledger = current_usage()
+        if ledger is not None:
+            ledger.merge(usage, coalesced=joined)
+        return result
+
+    @staticmethod
+    async def _call(make_call) -> tuple[Any, UsageLedger]:
+        # The task runs in a copy of the first caller's context, so this
+        # ledger is not the first caller's
+        first = current_usage()
+        usage = start_usage(first.model_name) if first else start_usage()
+        return await make_call(), usage
+
+    def _forget(self, key: str, entry: list) -> None:
+        # A newer call with the same key may have taken its place
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+    def _finished(self, key: str, entry: list, task: asyncio.Task) -> None:
+        self._forget(key, entry)
+        # Nobody may be waiting, do not warn about an unretrieved exception
+        task.cancelled() or task.exception()
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+            "in_flight": len(self._in_flight),
+        }
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
+
+
+async def cached_call(key: str, make_call) -> Any:
+    """
+    The cached value of key, or the result of make_call(), cached. Identical
+    calls already in flight are awaited instead of repeated (COALESCE_REQUESTS).
+    """
+    cache = get_cache()
+    result = await cache.get_async(key)
+    if result is not MISS:
+        return result
+
+    async def call_and_cache():
+        value = await make_call()
+        await cache.set_async(key, value)
+        return value
+
+    if config.COALESCE_REQUESTS:
+        return await _single_flight.do(key, call_and_cache)
+    return await call_and_cache()
+
+
+def _sha256(value: str | bytes) -> str:
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha256(value).hexdigest()
+
+
+def document_key(data: bytes, file_type: str, variant: str = "") -> str:
+    # variant tells apart the same file extracted with other settings
+    return f"document:{file_type}:{variant}:{_sha256(data)}" if variant else f"document:{file_type}:{_sha256(data)}"
+
+
+def section_key(resume_text: str, section: str, model: str, template: str) -> str:
+    # Whitespace-only differences in the extracted text map to the same key
+    normalized = " ".join(resume_text.split())
+    return f"section:{section}:{model}:{_sha256(template)[:16]}:{_sha256(normalized)}"
+
+
+def cache_section(section: str, model: str, template: Callable[[], str]):
+    """
+    Cache an async extract_*(resume_text) coroutine by text, section, model
+    and prompt, and coalesce identical calls in flight. template is called
+    for the prompt on each call, so the prompt can be built lazily.
+    """
+
+    def decorator(extract):
+        @wraps(extract)
+        async def wrapper(resume_text: str, *args, **kwargs):
+            key = section_key(resume_text, section, model, template())
+            return await cached_call(key, lambda: extract(resume_text, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,187 @@
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def _int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.lower() in ("1", "true", "yes", "on") if value else default
+
+
+def _float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _per_priority(name: str, default: str) -> dict[str, float]:
+    # "first=8,second=3" -> {"first": 8.0, "second": 3.0}
+    pairs = (item.split("=", 1) for item in os.getenv(name, default).split(",") if "=" in item)
+    return {key.strip(): float(value) for key, value in pairs}
+
+
+def _names(name: str, default: str = "") -> frozenset:
+    # Comma separated names, like section names
+    return frozenset(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+# Section fan-out
+# Max number of LLM chains running at the same time for one request
+MAX_SECTION_CONCURRENCY = _int("MAX_SECTION_CONCURRENCY", 4)
+# Seconds before a single section is given up on (0 = no timeout)
+SECTION_TIMEOUT_SECONDS = _float("SECTION_TIMEOUT_SECONDS", 60.0)
+
+# /parse-all
+# Number of LLM calls the 12 sections are split across (1 = a single call)
+PARSE_ALL_GROUPS = _int("PARSE_ALL_GROUPS", 1)
+
+# Result cache
+# memory (in-process LRU), sqlite (shared by workers) or none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_MAX_ENTRIES = _int("CACHE_MAX_ENTRIES", 1024)
+# Seconds an entry stays valid (0 = never expires)
+CACHE_TTL_SECONDS = _float("CACHE_TTL_SECONDS", 24 * 60 * 60)
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "resume_cache.sqlite3")
+# Identical section calls (same text, section, model and prompt) already in
+# flight are awaited instead of sent to the LLM again
+COALESCE_REQUESTS = _bool("COALESCE_REQUESTS", True)
+
+# Uploads
+# Upload bytes kept in memory before spooling to a temporary file
+UPLOAD_SPOOL_MAX_BYTES = _int("UPLOAD_SPOOL_MAX_BYTES", 4 * 1024 * 1024)
+# Largest PDF/DOCX accepted, bigger uploads get a 413 while they are received (0 = no limit)
+UPLOAD_MAX_BYTES = _int("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+# Largest /batch request, all files and ZIP archives together (0 = no limit)
+BATCH_MAX_BYTES = _int("BATCH_MAX_BYTES", 200 * 1024 * 1024)
+# Most files in one /batch request, counting the members of ZIP archives (0 = no limit)
+BATCH_MAX_FILES = _int("BATCH_MAX_FILES", 1000)
+# PDFs with more pages are rejected before their text is extracted. Off by
+# default, academic CVs run to 200 pages (0 = no limit)
+UPLOAD_MAX_PAGES = _int("UPLOAD_MAX_PAGES", 0)
+
+# Text extraction
+# process or thread pool used for extract_text
+EXTRACT_POOL = os.getenv("EXTRACT_POOL", "process").lower()
+EXTRACT_WORKERS = _int("EXTRACT_WORKERS", os.cpu_count() or 1)
+# Seconds a worker may run one extraction job before it is killed (0 = no timeout)
+EXTRACT_TIMEOUT_SECONDS = _float("EXTRACT_TIMEOUT_SECONDS", 30.0)
+# Only the first pages of a PDF are read, the rest is dropped (0 = all pages)
+EXTRACT_MAX_PAGES = _int("EXTRACT_MAX_PAGES", 0)
+# Extraction stops once this many characters are read, and the normalized
+# text is cut to it. Normalization runs in between, so a cut document can
+# come back shorter than this (0 = no limit)
+EXTRACT_MAX_CHARS = _int("EXTRACT_MAX_CHARS", 0)
+# PDFs with at least this many pages are split across worker processes
+PDF_PARALLEL_MIN_PAGES = _int("PDF_PARALLEL_MIN_PAGES", 30)
+# Smallest page range sent to one worker process
+PDF_PAGES_PER_CHUNK = _int("PDF_PAGES_PER_CHUNK", 10)
+
+# Text normalization
+# Clean the extracted text once per document before it is sent to the LLM
+NORMALIZE_TEXT = _bool("NORMALIZE_TEXT", True)
+# Drop headers, footers and page numbers repeated at the top or bottom of the pages
+NORMALIZE_REPEATED_LINES = _bool("NORMALIZE_REPEATED_LINES", True)
+# Join words hyphenated across line breaks ("devel-\nopment")
+NORMALIZE_DEHYPHENATE = _bool("NORMALIZE_DEHYPHENATE", True)
+# Keep DOCX tables, a row of short cells on one line as "cell | cell"
+NORMALIZE_TABLES = _bool("NORMALIZE_TABLES", True)
+
+# Section segmentation
+# Send each extractor only the resume blocks under its headings
+SEGMENT_SECTIONS = _bool("SEGMENT_SECTIONS", True)
+# Use bold/large fonts and heading styles to find headings
+SEGMENT_LAYOUT_HINTS = _bool("SEGMENT_LAYOUT_HINTS", True)
+# Optional sections whose presence confidence (0-1) is below this are not sent
+# to the LLM and come back empty (0 disables skipping)
+SKIP_MIN_CONFIDENCE = _float("SKIP_MIN_CONFIDENCE", 0.5)
+
+# Contact fields
+# Find email, phone and LinkedIn/GitHub URLs with regexes and PDF/DOCX links,
+# and only ask the LLM for the personal info fields that were not found
+CONTACT_FAST_PATH = _bool("CONTACT_FAST_PATH", True)
+
+# Document store (POST /documents, then parse by ID)
+DOCUMENTS_DB_PATH = os.getenv("DOCUMENTS_DB_PATH", "resume_documents.sqlite3")
+# Seconds a stored document can be parsed by ID (0 = kept forever)
+DOCUMENT_TTL_SECONDS = _float("DOCUMENT_TTL_SECONDS", 24 * 60 * 60)
+
+# Metrics
+# Add a per-request timing breakdown (seconds per stage and section) to meta.timings
+META_TIMINGS = _bool("META_TIMINGS", False)
+
+# Batch jobs
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "resume_jobs.sqlite3")
+# Files of all jobs being parsed at the same time
+BATCH_FILE_CONCURRENCY = _int("BATCH_FILE_CONCURRENCY", 8)
+# LLM chains of all jobs running at the same time, keep it under the provider rate limit
+BATCH_LLM_CONCURRENCY = _int("BATCH_LLM_CONCURRENCY", 16)
+# A job is taken over by another server process when the one running it has not renewed its lease for this long
+JOB_LEASE_SECONDS = _float("JOB_LEASE_SECONDS", 60.0)
+
+# LLM
+# openai, or fake for the offline stand-in in app/fake_llm.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+# Mean seconds per fake LLM call, relative jitter, share of failing calls and random seed
+FAKE_LLM_LATENCY = _float("FAKE_LLM_LATENCY", 1.0)
+FAKE_LLM_JITTER = _float("FAKE_LLM_JITTER", 0.25)
+FAKE_LLM_ERROR_RATE = _float("FAKE_LLM_ERROR_RATE", 0.0)
+FAKE_LLM_SEED = _int("FAKE_LLM_SEED", 0)
+# Mean seconds per fake call of the small model
+FAKE_LLM_SMALL_LATENCY = _float("FAKE_LLM_SMALL_LATENCY", 0.4)
+# Model of the sections not routed to the small one
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+# Cheaper, faster model tried first for SMALL_MODEL_SECTIONS (empty = LLM_MODEL for all)
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")
+# Sections sent to the small model: comma separated section names, or all.
+# By default the simple ones of the second and third priority endpoints.
+SMALL_MODEL_SECTIONS = _names(
+    "SMALL_MODEL_SECTIONS", "projects,certifications,awards,languages,memberships,training,skilling,conferences"
+)
+# Ask LLM_MODEL again when the small model's answer does not match the
+# section schema or has entries not found in the resume
+MODEL_ESCALATION = _bool("MODEL_ESCALATION", True)
+# Sections answered with the model's structured output (the answer must match
+# the section's JSON schema) instead of format instructions in the prompt and
+# free-text JSON parsing: comma separated section names, or all
+STRUCTURED_OUTPUT_SECTIONS = _names("STRUCTURED_OUTPUT_SECTIONS")
+# Max tokens of one LLM answer (0 = the model's limit)
+LLM_MAX_OUTPUT_TOKENS = _int("LLM_MAX_OUTPUT_TOKENS", 0)
+
+# OpenAI client
+# Another OpenAI compatible endpoint, like a local mock server (benchmarks/mock_openai.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# HTTP connection pool shared by all LLM calls
+LLM_MAX_CONNECTIONS = _int("LLM_MAX_CONNECTIONS", 64)
+LLM_MAX_KEEPALIVE_CONNECTIONS = _int("LLM_MAX_KEEPALIVE_CONNECTIONS", 32)
+LLM_HTTP_TIMEOUT_SECONDS = _float("LLM_HTTP_TIMEOUT_SECONDS", 60.0)
+# Token bucket on estimated prompt tokens, set to the account's TPM limit (0 = no limit)
+LLM_TOKENS_PER_MINUTE = _int("LLM_TOKENS_PER_MINUTE", 0)
+# Adaptive concurrency: calls in flight start at the initial limit, grow by one
+# per limit successful calls and halve on a 429 or a call slower than the
+# target latency (0 = only 429s shrink it)
+LLM_INITIAL_CONCURRENCY = _int("LLM_INITIAL_CONCURRENCY", 8)
+LLM_MIN_CONCURRENCY = _int("LLM_MIN_CONCURRENCY", 1)
+LLM_MAX_CONCURRENCY = _int("LLM_MAX_CONCURRENCY", 64)
+LLM_TARGET_LATENCY_SECONDS = _float("LLM_TARGET_LATENCY_SECONDS", 0.0)
+# Retries of 429s, timeouts, connection and 5xx errors with jittered exponential backoff
+LLM_MAX_RETRIES = _int("LLM_MAX_RETRIES", 4)
+LLM_RETRY_BASE_SECONDS = _float("LLM_RETRY_BASE_SECONDS", 0.5)
+LLM_RETRY_MAX_SECONDS = _float("LLM_RETRY_MAX_SECONDS", 20.0)
+
+# Admission control
+# Queue the LLM calls per endpoint priority (first, second, third, and batch
+# for batch jobs) and turn away new requests of saturated priorities
+ADMISSION_CONTROL = _bool("ADMISSION_CONTROL", True)
+# Share of the LLM concurrency slots each priority gets while several are waiting
+PRIORITY_WEIGHTS = _per_priority("PRIORITY_WEIGHTS", "first=8,second=3,third=1,batch=1")
+# New requests get a 429 once this many LLM calls of their priority are queued (0 = no limit)
+PRIORITY_MAX_QUEUE = _per_priority("PRIORITY_MAX_QUEUE", "first=0,second=48,third=16")
+# New requests get a 503 once the oldest queued LLM call of their priority
+# has waited this many seconds (0 = no limit)
+PRIORITY_MAX_WAIT_SECONDS = _per_priority("PRIORITY_MAX_WAIT_SECONDS", "first=0,second=10,third=5")
@@ -0,0 +1,94 @@
+import re
+from typing import Iterable, Optional
+
+
+# Contact fields found without the LLM, as dotted PersonalInfo paths
+FAST_PATH_FIELDS = ["email", "mobileNumber.countryCode", "mobileNumber.number", "socialUrls.linkedin", "socialUrls.github"]
+
+EMAIL = re.compile(r"(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}(?![\w-])", re.IGNORECASE)
+LINKEDIN = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/(?:in|pub)/[\w%-]+/?", re.IGNORECASE)
+# github.com/<user>, but not github.com/<user>/<repo>
+GITHUB = re.compile(r"(?:https?://)?(?:www\.)?github\.com/[a-z\d](?:[a-z\d-]{0,38})/?(?![\w/-])", re.IGNORECASE)
+PHONE = re.compile(r"(?<![\w+])(\+\d{1,3})?[\s.-]?(\(?\d[\d\s().-]{5,16}\d)(?![\w-])")
+PHONE_LABEL = re.compile(r"\b(?:phone|mobile|mob|tel|telephone|cell|contact|ph)\b", re.IGNORECASE)
+# Date ranges like "2004 - 2008" look like phone numbers
+YEAR_RANGE = re.compile(r"^(?:19|20)\d\d\s*[-–]\s*(?:19|20)\d\d$")
+
+
+def _url(match: str) -> str:
+    url = match.rstrip("/")
+    return url if url.lower().startswith("http") else "https://" + url
+
+
+def _first(pattern: re.Pattern, texts: Iterable[str]) -> Optional[str]:
+    for text in texts:
+        match = pattern.search(text)
+        if match:
+            return match.group(0)
+    return None
+
+
+def find_phone(text: str) -> Optional[dict]:
+    """The first phone number as a MobileNumber dict, country code only when written with a +."""
+    for line in text.splitlines():
+        for match in PHONE.finditer(line):
+            country_code, rest = match.group(1), match.group(2)
+            if YEAR_RANGE.match(rest.strip()):
+                continue
+            digits = re.sub(r"\D", "", rest)
+            labeled = bool(PHONE_LABEL.search(line))
+            if not 7 <= len(digits) <= 12 or (not country_code and not labeled and len(digits) < 10):
+                continue
+            return {"countryCode": country_code, "number": digits}
+    return None
+
+
+def find_contacts(text: str, links: Iterable[str] = ()) -> dict:
+    """
+    Email, phone and LinkedIn/GitHub URLs found with regexes in the text and
+    in the document's link targets, shaped like PersonalInfo. Only found
+    values are included.
+    """
+    links = list(links)
+    contacts = {}
+    mailto = [link[len("mailto:"):] for link in links if link.lower().startswith("mailto:")]
+    email = _first(EMAIL, mailto + [text])
+    if email:
+        contacts["email"] = email
+    phone = find_phone(text)
+    if phone:
+        contacts["mobileNumber"] = {key: value for key, value in phone.items() if value}
+    social = {}
+    # Link targets first: the visible text is often just "LinkedIn"
+    linkedin = _first(LINKEDIN, links + [text])
+    if linkedin:
+        social["linkedin"] = _url(linkedin)
+    github = _first(GITHUB, links + [text])
+    if github:
+        social["github"] = _url(github)
+    if social:
+        contacts["socialUrls"] = social
+    return contacts
+
+
+def resolved_fields(contacts: dict) -> frozenset:
+    """The FAST_PATH_FIELDS present in find_contacts() output."""
+    resolved = set()
+    for path in FAST_PATH_FIELDS:
+        value = contacts
+        for key in path.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value:
+            resolved.add(path)
+    return frozenset(resolved)
+
+
+def merge_contacts(result: Optional[dict], contacts: dict) -> dict:
+    """LLM output with the locally found fields filled in over it."""
+    merged = dict(result or {})
+    for key, value in contacts.items():
+        if isinstance(value, dict):
+            merged[key] = {**(merged.get(key) or {}), **value}
+        else:
+            merged[key] = value
+    return merged
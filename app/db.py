@@ -0,0 +1,26 @@
+"""
+SQLite helpers shared by the stores kept in SQLite files: the result cache,
+batch jobs and uploaded documents.
+"""
+import sqlite3
+import threading
+from typing import Callable
+
+
+def thread_connections(path: str) -> Callable[[], sqlite3.Connection]:
+    """
+    A function returning the calling thread's connection to the SQLite file,
+    opened on first use. WAL mode lets readers run while another thread or
+    server process writes.
+    """
+    local = threading.local()
+
+    def connect() -> sqlite3.Connection:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            local.conn = conn
+        return conn
+
+    return connect
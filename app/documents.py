@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Optional
+
+from app import config
+from app.db import thread_connections
+from app.pipeline import Document
+
+
+class DocumentStore:
+    """
+    Uploaded resumes and their extracted text, kept in SQLite by a hash of
+    the file bytes so they can be parsed by ID without uploading them again.
+    Uploading the same file again returns the same ID and renews its TTL.
+    """
+
+    def __init__(self, path: str, ttl: float = 0):
+        self.path = path
+        self.ttl = ttl
+        self._connect = thread_connections(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, filename TEXT NOT NULL, file_type TEXT NOT NULL, "
+                "size INTEGER NOT NULL, data BLOB NOT NULL, text TEXT NOT NULL, "
+                "headings TEXT NOT NULL, links TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL, normalization TEXT NOT NULL DEFAULT '{}')"
+            )
+            # Document stores created before normalization was kept
+            try:
+                conn.execute("ALTER TABLE documents ADD COLUMN normalization TEXT NOT NULL DEFAULT '{}'")
+            except sqlite3.OperationalError:
+                pass
+
+    @staticmethod
+    def document_id(data: bytes, file_type: str) -> str:
+        return hashlib.sha256(file_type.encode() + b":" + data).hexdigest()
+
+    def put(self, filename: str, file_type: str, data: bytes, document: Document) -> dict:
+        document_id = self.document_id(data, file_type)
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else 0
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(id, filename, file_type, size, data, text, headings, links, created_at, expires_at, normalization) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document_id, filename, file_type, len(data), data, document.text,
+                    json.dumps(document.headings), json.dumps(document.links), now, expires_at,
+                    json.dumps(document.normalization),
+                ),
+            )
+            conn.execute("DELETE FROM documents WHERE expires_at != 0 AND expires_at < ?", (now,))
+        return self.info(document_id)
+
+    def info(self, document_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT filename, file_type, size, LENGTH(text), created_at, expires_at FROM documents "
+            "WHERE id = ? AND (expires_at = 0 OR expires_at >= ?)",
+            (document_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "document_id": document_id,
+            "filename": row[0],
+            "file_type": row[1],
+            "size": row[2],
+            "char_count": row[3],
+            "created_at": row[4],
+            "expires_at": row[5] or None,
+        }
+
+    def get(self, document_id: str) -> Optional[Document]:
+        row = self._connect().execute(
+            "SELECT text, headings, links, normalization FROM documents "
+            "WHERE id = ? AND (expires_at = 0 OR expires_at >= ?)",
+            (document_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return Document(row[0], json.loads(row[1]), json.loads(row[2]), {"stored": True}, json.loads(row[3]))
+
+    def delete(self, document_id: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM documents WHERE id = ?", (document_id,)).rowcount > 0
+
+
+_store: Optional[DocumentStore] = None
+
+
+def get_store() -> DocumentStore:
+    global _store
+    if _store is None:
+        _store = DocumentStore(config.DOCUMENTS_DB_PATH, ttl=config.DOCUMENT_TTL_SECONDS)
+    return _store
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+# Canned answer of every section
+FAKE_RESPONSES = {
+    "personal_info": {
+        "firstName": "Jane", "lastName": "Doe", "email": "jane.doe@example.com",
+        "mobileNumber": {"countryCode": "+1", "number": "5550100"},
+        "dateOfBirth": {"date": "12", "month": "May", "year": "1990"},
+        "address": "1 Main Street, Springfield, IL 62701, USA", "country": "USA", "state": "IL",
+        "city": "Springfield", "postalCode": "62701", "about": "Backend engineer.",
+        "socialUrls": {"linkedin": "https://linkedin.com/in/janedoe", "github": "https://github.com/janedoe"},
+    },
+    "skills": [
+        {"skill": "Python", "occupation": "Software Developer"},
+        {"skill": "SQL", "occupation": "Database Administrator"},
+    ],
+    "education": [{
+        "institution": "State University", "course": "BSc Computer Science", "location": "Springfield, USA",
+        "startDate": {"date": None, "month": "September", "year": "2008"},
+        "endDate": {"date": None, "month": "June", "year": "2012"}, "description": None,
+    }],
+    "employment": [{
+        "organizationName": "Acme Corp", "durationInMonths": 36, "type": "full_time", "location": "Chicago, USA",
+        "startDate": {"date": None, "month": "July", "year": "2012"},
+        "endDate": {"date": None, "month": "July", "year": "2015"}, "jobTitle": "Software Engineer",
+    }],
+    "projects": [{
+        "projectName": "Payments API", "startDate": None, "endDate": None, "durationInMonths": 6,
+        "description": "REST API for payments.", "organizationName": "Acme Corp", "location": None,
+        "type": "employment",
+    }],
+    "certifications": [{
+        "certificationName": "AWS Solutions Architect", "organizationName": "Amazon", "location": None,
+        "startDate": None, "endDate": None, "durationInMonths": None, "description": None,
+    }],
+    "awards": [{"awardName": "Employee of the Year", "location": None, "givenDate": None, "description": None}],
+    "languages": [{"language": "English", "read": True, "write": True, "speak": True}],
+    "memberships": [],
+    "training": [],
+    "skilling": [],
+    "conferences": [],
+}
+
+# A property name that only appears in the schema of that section
+_SECTION_MARKERS = [
+    ("firstName", "personal_info"),
+    ("occupation", "skills"),
+    ("institution", "education"),
+    ("jobTitle", "employment"),
+    ("projectName", "projects"),
+    ("certificationName", "certifications"),
+    ("awardName", "awards"),
+    ("speak", "languages"),
+    ("trainingName", "training"),
+    ("skillingName", "skilling"),
+    ("conferenceName", "conferences"),
+    ("organization", "memberships"),
+]
+
+_GROUP_SECTION = re.compile(r"^- (\w+): ", re.MULTILINE)
+
+
+def fake_response(prompt: str) -> Any:
+    """The canned answer for a section or grouped prompt."""
+    # Only look at the instructions, not the resume text
+    instructions = prompt.split("Resume text:")[0]
+    group = [name for name in _GROUP_SECTION.findall(instructions) if name in FAKE_RESPONSES]
+    if group:
+        return {name: FAKE_RESPONSES[name] for name in group}
+    for marker, section in _SECTION_MARKERS:
+        if f'"{marker}"' in instructions:
+            return FAKE_RESPONSES[section]
+    return []
+
+
+def fake_structured_response(prompt: str, schema: dict) -> Any:
+    """The canned answer shaped for a structured output JSON schema."""
+    # The field names are in the schema instead of the format instructions
+    answer = fake_response(json.dumps(schema) + "\n" + prompt)
+    if set(schema.get("properties", {})) == {"items"}:
+        # List sections are wrapped in an object with an items list
+        return {"items": answer if isinstance(answer, list) else [answer]}
+    return answer
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for ChatOpenAI used by benchmarks. Answers with canned
+    JSON after a simulated latency and fails a share of the calls. With
+    tools bound (with_structured_output) it answers with a tool call.
+    """
+
+    model_name: str = "gpt-4o"
+    latency: float = 1.0
+    jitter: float = 0.25
+    error_rate: float = 0.0
+    seed: Optional[int] = 0
+    # Seconds spent answering, summed over all calls
+    busy_seconds: float = 0.0
+    calls: int = 0
+
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _delay(self) -> float:
+        return max(0.0, self._random.gauss(self.latency, self.jitter * self.latency))
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _answer(self, messages: list[BaseMessage], tools: Optional[list] = None) -> ChatResult:
+        self.calls += 1
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("Fake LLM error")
+        prompt = "\n".join(str(message.content) for message in messages)
+        tool_calls = []
+        if tools:
+            function = tools[0]["function"]
+            args = fake_structured_response(prompt, function["parameters"])
+            tool_calls = [{"name": function["name"], "args": args, "id": f"call_{self.calls}"}]
+            content = json.dumps(args)
+        else:
+            content = json.dumps(fake_response(prompt))
+        # The schema of bound tools is sent as input too
+        input_chars = len(prompt) + (len(json.dumps(tools)) if tools else 0)
+        message = AIMessage(
+            content="" if tool_calls else content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_chars // 4,
+                "output_tokens": len(content) // 4,
+                "total_tokens": (input_chars + len(content)) // 4,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"model_name": self.model_name})
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        delay = self._delay()
+        time.sleep(delay)
+        self.busy_seconds += delay
+        return self._answer(messages, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        delay = self._delay()
+        await asyncio.sleep(delay)
+        self.busy_seconds += delay
+        return self._answer(messages, tools)
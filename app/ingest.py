@@ -0,0 +1,128 @@
+import io
+import zipfile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app import config
+
+
+CHUNK_SIZE = 64 * 1024
+# Room for the multipart boundaries and headers around a file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(ValueError):
+    """An upload rejected before extraction, with the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_file_type(data: bytes) -> Optional[str]:
+    """pdf, docx or zip from the file's magic bytes, None for anything else."""
+    if data[:4] == b"PK\x03\x04":
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return None
+        return "docx" if "word/document.xml" in names else "zip"
+    # Some PDF writers put junk before the header, readers accept it in the first 1 KB.
+    # Checked after ZIP, whose first member can be a stored PDF.
+    if b"%PDF-" in data[:1024]:
+        return "pdf"
+    return None
+
+
+def check_docx(data: bytes) -> None:
+    """Reject DOCX files that unpack to far more than the upload limit (zip bombs)."""
+    if not config.UPLOAD_MAX_BYTES:
+        return
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        unpacked = sum(member.file_size for member in archive.infolist())
+    if unpacked > config.UPLOAD_MAX_BYTES * 20:
+        raise UploadError("The DOCX file unpacks to too much data.", 413)
+
+
+def detect_upload(filename: str, data: bytes, allowed: tuple[str, ...] = ("pdf", "docx")) -> str:
+    """The type of an upload from its content, not its name. Raises UploadError."""
+    if not data:
+        raise UploadError(f"{filename}: the file is empty.", 400)
+    file_type = sniff_file_type(data)
+    if file_type not in allowed:
+        kinds = ", ".join(kind.upper() for kind in allowed[:-1]) + " and " + allowed[-1].upper()
+        raise UploadError(f"{filename}: only {kinds} files are supported.", 415)
+    if file_type == "docx":
+        check_docx(data)
+    return file_type
+
+
+async def read_limited(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload in chunks, stopping with a 413 as soon as it is over max_bytes."""
+    if max_bytes and file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{file.filename}: the file is larger than {max_bytes} bytes.")
+    chunks, size = [], 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: the file is larger than {max_bytes} bytes.")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def request_limit(path: str) -> int:
+    """Max request body bytes of a route, 0 for no limit."""
+    if path.startswith("/batch"):
+        return config.BATCH_MAX_BYTES
+    if config.UPLOAD_MAX_BYTES:
+        return config.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+    return 0
+
+
+class RequestSizeLimit:
+    """
+    ASGI middleware that rejects a request body over the route's limit with
+    a 413 while it is being received, before it is spooled to disk. A bigger
+    Content-Length is rejected without reading the body at all.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        max_bytes = request_limit(scope["path"])
+        if not max_bytes:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            return await self._reject(send, max_bytes)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # FastAPI answers an HTTPException raised while reading the form as is
+                    raise HTTPException(status_code=413, detail=f"The request is larger than {max_bytes} bytes.")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send, max_bytes: int) -> None:
+        body = ('{"detail":"The request is larger than %d bytes."}' % max_bytes).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
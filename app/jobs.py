@@ -0,0 +1,320 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import zipfile
+from typing import Optional
+
+from app import config
+from app.db import thread_connections
+from app.ingest import UploadError, check_docx, detect_upload, sniff_file_type
+from app.llm import select_extractors
+from app.metrics import start_timings
+from app.pipeline import build_response, load_document, route_sections
+from app.runner import run_sections
+from app.scheduler import start_priority
+from app.tokens import start_usage
+
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_TYPES = ("pdf", "docx")
+
+
+class JobStore:
+    """
+    Batch jobs and their files, kept in SQLite so a restart does not lose work.
+    A job is run by the server process that holds its lease (owner and
+    heartbeat), so with several processes each job is parsed only once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connect = thread_connections(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                # priority holds the requested sections, its name is kept for existing stores
+                "id TEXT PRIMARY KEY, priority TEXT NOT NULL, status TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT, heartbeat REAL)"
+            )
+            # Job stores created before the lease
+            for column in ("owner TEXT", "heartbeat REAL"):
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+                except sqlite3.OperationalError:
+                    pass
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_files ("
+                "job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT NOT NULL, "
+                "file_type TEXT NOT NULL, data BLOB, status TEXT NOT NULL, "
+                "result TEXT, error TEXT, PRIMARY KEY (job_id, idx))"
+            )
+
+    def create(self, sections: str, files: list[tuple[str, str, bytes]], owner: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, priority, status, created_at, updated_at, owner, heartbeat) "
+                "VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+                (job_id, sections, now, now, owner, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, file_type, data, status) "
+                "VALUES (?, ?, ?, ?, ?, 'pending')",
+                [(job_id, idx, filename, file_type, data) for idx, (filename, file_type, data) in enumerate(files)],
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT priority, status, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM job_files WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+        total = sum(counts.values())
+        finished = counts.get("done", 0) + counts.get("failed", 0)
+        return {
+            "job_id": job_id,
+            "sections": row[0],
+            "status": row[1],
+            "total": total,
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "pending": total - finished,
+            "progress": round(finished / total, 4) if total else 1.0,
+            "created_at": row[2],
+            "updated_at": row[3],
+        }
+
+    def results(self, job_id: str) -> list[dict]:
+        rows = self._connect().execute(
+            "SELECT idx, filename, status, result, error FROM job_files WHERE job_id = ? ORDER BY idx",
+            (job_id,),
+        ).fetchall()
+        return [
+            {
+                "index": idx,
+                "filename": filename,
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error,
+            }
+            for idx, filename, status, result, error in rows
+        ]
+
+    def pending_files(self, job_id: str) -> list[int]:
+        rows = self._connect().execute(
+            "SELECT idx FROM job_files WHERE job_id = ? AND status = 'pending' ORDER BY idx", (job_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def file_data(self, job_id: str, idx: int) -> tuple[str, bytes]:
+        return self._connect().execute(
+            "SELECT file_type, data FROM job_files WHERE job_id = ? AND idx = ?", (job_id, idx)
+        ).fetchone()
+
+    def claimable_jobs(self, owner: str, lease: float) -> list[str]:
+        """Unfinished jobs that are ours or whose owner stopped renewing its lease."""
+        rows = self._connect().execute(
+            "SELECT id FROM jobs WHERE status IN ('pending', 'running') "
+            "AND (owner IS NULL OR owner = ? OR heartbeat < ?) ORDER BY created_at",
+            (owner, time.time() - lease),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """Take the job's lease, unless another owner renewed it in the last lease seconds."""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET owner = ?, heartbeat = ? WHERE id = ? AND status IN ('pending', 'running') "
+                "AND (owner IS NULL OR owner = ? OR heartbeat < ?)",
+                (owner, now, job_id, owner, now - lease),
+            ).rowcount > 0
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Renew the lease. False when another owner took the job over."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ?", (time.time(), job_id, owner)
+            ).rowcount > 0
+
+    def set_status(self, job_id: str, status: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def finish_file(self, job_id: str, idx: int, result: Optional[dict], error: Optional[str]) -> None:
+        # The file bytes are not needed once the file is parsed
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = ?, result = ?, error = ?, data = NULL WHERE job_id = ? AND idx = ?",
+                ("failed" if error else "done", json.dumps(result) if result else None, error, job_id, idx),
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+
+def expand_upload(filename: str, data: bytes, max_bytes: int = 0, max_files: int = 0) -> list[tuple[str, str, bytes]]:
+    """
+    (filename, file_type, bytes) of a PDF/DOCX upload, or of every PDF/DOCX
+    inside a ZIP. Types are sniffed from the content, not the filenames.
+    A ZIP whose members unpack to more than max_bytes, or hold more than
+    max_files files, is rejected before anything is unpacked (0 = no limit).
+    """
+    file_type = detect_upload(filename, data, allowed=SUPPORTED_TYPES + ("zip",))
+    if file_type in SUPPORTED_TYPES:
+        return [(filename, file_type, data)]
+
+    files = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        # Sizes from the ZIP directory. zipfile stops a member that unpacks
+        # to more than its listed size, so they cannot lie.
+        members = [member for member in archive.infolist() if not member.is_dir()]
+        if max_files and len(members) > max_files:
+            raise UploadError(f"{filename}: the archive holds more than {max_files} files.", 413)
+        if max_bytes and sum(member.file_size for member in members) > max_bytes:
+            raise UploadError(f"{filename}: the archive unpacks to more than {max_bytes} bytes.", 413)
+        for member in members:
+            if config.UPLOAD_MAX_BYTES and member.file_size > config.UPLOAD_MAX_BYTES:
+                raise UploadError(f"{member.filename}: the file is larger than {config.UPLOAD_MAX_BYTES} bytes.", 413)
+        for member in members:
+            member_data = archive.read(member)
+            member_type = sniff_file_type(member_data)
+            if member_type == "docx":
+                check_docx(member_data)
+            if member_type in SUPPORTED_TYPES:
+                files.append((member.filename, member_type, member_data))
+    return files
+
+
+_store: Optional[JobStore] = None
+_running: dict[str, asyncio.Task] = {}
+_sweeper: Optional[asyncio.Task] = None
+_file_semaphore: Optional[asyncio.Semaphore] = None
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_store() -> JobStore:
+    global _store
+    if _store is None:
+        _store = JobStore(config.JOBS_DB_PATH)
+    return _store
+
+
+def owner() -> str:
+    """This server process, as the owner of the jobs it runs."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _limited(extractor):
+    # Shares the LLM concurrency of all jobs
+    async def wrapper(resume_text: str, **kwargs):
+        async with _llm_semaphore:
+            return await extractor(resume_text, **kwargs)
+
+    return wrapper
+
+
+async def _parse_file(job_id: str, sections: str, idx: int) -> None:
+    store = get_store()
+    async with _file_semaphore:
+        # Only the files being parsed are held in memory, not the whole job
+        file_type, data = await asyncio.to_thread(store.file_data, job_id, idx)
+        start_time = time.time()
+        start_timings()
+        # Extraction and LLM calls queue behind the requests of every priority
+        start_priority("batch")
+        try:
+            document = await load_document(data, file_type)
+            start_usage()
+            extractors = {name: _limited(extractor) for name, extractor in select_extractors(sections.split(",")).items()}
+            extractors, routing = route_sections(document, extractors)
+            parsed, errors = await run_sections(document.text, extractors)
+            response = await build_response(document, parsed, errors, start_time, **routing)
+            await asyncio.to_thread(store.finish_file, job_id, idx, response, None)
+        except Exception as e:
+            logger.warning("Job %s file %s failed: %s", job_id, idx, e)
+            await asyncio.to_thread(store.finish_file, job_id, idx, None, str(e) or e.__class__.__name__)
+
+
+async def _heartbeat(job_id: str) -> None:
+    # Renews the lease while the job runs, and stops the job if it was taken over
+    while True:
+        await asyncio.sleep(config.JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await asyncio.to_thread(get_store().heartbeat, job_id, owner())
+        except sqlite3.Error:
+            # Busy or locked database: try again, the lease lasts three beats
+            logger.exception("Renewing the lease of batch job %s failed", job_id)
+            continue
+        if not renewed:
+            logger.warning("Batch job %s was taken over by another process", job_id)
+            _running[job_id].cancel()
+            return
+
+
+async def _run_job(job_id: str) -> None:
+    store = get_store()
+    try:
+        if not await asyncio.to_thread(store.claim, job_id, owner(), config.JOB_LEASE_SECONDS):
+            logger.info("Batch job %s is run by another process", job_id)
+            return
+        heartbeat = asyncio.create_task(_heartbeat(job_id))
+        try:
+            sections = (await asyncio.to_thread(store.get, job_id))["sections"]
+            await asyncio.to_thread(store.set_status, job_id, "running")
+            pending = await asyncio.to_thread(store.pending_files, job_id)
+            await asyncio.gather(*(_parse_file(job_id, sections, idx) for idx in pending))
+            await asyncio.to_thread(store.set_status, job_id, "done")
+        finally:
+            heartbeat.cancel()
+    finally:
+        _running.pop(job_id, None)
+
+
+def start_job(job_id: str) -> None:
+    global _file_semaphore, _llm_semaphore
+    if _file_semaphore is None:
+        _file_semaphore = asyncio.Semaphore(config.BATCH_FILE_CONCURRENCY)
+        _llm_semaphore = asyncio.Semaphore(config.BATCH_LLM_CONCURRENCY)
+    if job_id not in _running:
+        _running[job_id] = asyncio.create_task(_run_job(job_id))
+
+
+def resume_unfinished_jobs() -> None:
+    """
+    Restart jobs that were pending or running when the server stopped, then
+    every JOB_LEASE_SECONDS take over the jobs of server processes that died.
+    Jobs whose owner still renews its lease are left to it.
+    """
+    global _sweeper
+    for job_id in get_store().claimable_jobs(owner(), config.JOB_LEASE_SECONDS):
+        if job_id not in _running:
+            logger.info("Resuming batch job %s", job_id)
+            start_job(job_id)
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep())
+
+
+async def _sweep() -> None:
+    while True:
+        await asyncio.sleep(config.JOB_LEASE_SECONDS)
+        try:
+            job_ids = await asyncio.to_thread(get_store().claimable_jobs, owner(), config.JOB_LEASE_SECONDS)
+        except sqlite3.Error:
+            logger.exception("Looking for abandoned batch jobs failed")
+            continue
+        for job_id in job_ids:
+            if job_id not in _running:
+                logger.info("Taking over batch job %s", job_id)
+                start_job(job_id)
@@ -1,20 +1,69 @@
+import json
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
-from typing import Optional
-from pydantic import BaseModel, Field
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
+from functools import cached_property, lru_cache
+from typing import Optional, get_args, get_origin
+from pydantic import BaseModel, Field, create_model
+from app import config
+from app.cache import cache_section, cached_call, section_key
+from app.contacts import find_contacts, merge_contacts, resolved_fields
+from app.llm_client import get_client
+from app.metrics import LLM_ESCALATIONS, LLM_IN_FLIGHT, LLM_SECONDS, PARSE_SECONDS, record
+from app.tokens import count_tokens, count_tokens_async, current_usage
 from enum import Enum
 
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+MODEL_NAME = config.LLM_MODEL
+
+# langchain and the OpenAI SDK take most of the import time of the app, so
+# the models and the section chains are only built on first use or by
+# warm_up() in the background after startup.
+_llms = {}
+_llm_lock = threading.Lock()
+
+
+def get_llm(model_name: str = MODEL_NAME):
+    """The chat model of that name, built on the first call."""
+    with _llm_lock:
+        if model_name not in _llms:
+            _llms[model_name] = _build_llm(model_name)
+    return _llms[model_name]
+
+
+def _build_llm(model_name: str):
+    if config.LLM_BACKEND == "fake":
+        # Offline stand-in with canned answers, see benchmarks/
+        from app.fake_llm import FakeChatModel
+
+        return FakeChatModel(
+            model_name=model_name,
+            latency=config.FAKE_LLM_LATENCY if model_name == MODEL_NAME else config.FAKE_LLM_SMALL_LATENCY,
+            jitter=config.FAKE_LLM_JITTER,
+            error_rate=config.FAKE_LLM_ERROR_RATE,
+            seed=config.FAKE_LLM_SEED,
+        )
+
+    from langchain_openai import ChatOpenAI
+    from app.llm_client import http_clients
+
+    http_client, http_async_client = http_clients()
+    return ChatOpenAI(
+        model=model_name,
+        temperature=0,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=config.OPENAI_BASE_URL,
+        timeout=config.LLM_HTTP_TIMEOUT_SECONDS or None,
+        max_tokens=config.LLM_MAX_OUTPUT_TOKENS or None,
+        # Retries are done by app/llm_client.py, which also adapts the concurrency
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
 
 # Sub-models
 class DateOfBirth(BaseModel):
@@ -147,317 +196,705 @@ class ConferenceItem(BaseModel):
     durationInMonths: Optional[int] = Field(description="Duration of the conference in months")
 
 
-award_parser = JsonOutputParser(pydantic_object=AwardItem)
-
-award_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract a list of awards or honors received by the person. For each award, include:\n"
-        "- awardName\n"
-        "- location\n"
-        "- givenDate (object: date, month, year)\n"
-        "- description\n\n"
-        "Format the output as a JSON list.\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": award_parser.get_format_instructions()}
+# Prompts, compiled with their schema's format instructions on first use (see Section)
+award_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract a list of awards or honors received by the person. For each award, include:\n"
+    "- awardName\n"
+    "- location\n"
+    "- givenDate (object: date, month, year)\n"
+    "- description\n\n"
+    "Format the output as a JSON list.\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-award_chain = award_prompt | llm | award_parser
-
-
-# Parser
-certification_parser = JsonOutputParser(pydantic_object=CertificationItem)
 
 # Prompt
-certification_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract certification details. For each certification, return:\n"
-        "- certificationName\n"
-        "- organizationName\n"
-        "- location\n"
-        "- startDate (object: date, month, year)\n"
-        "- endDate (object: date, month, year)\n"
-        "- durationInMonths\n"
-        "- description\n\n"
-        "Return a JSON list of such objects.\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": certification_parser.get_format_instructions()}
+certification_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract certification details. For each certification, return:\n"
+    "- certificationName\n"
+    "- organizationName\n"
+    "- location\n"
+    "- startDate (object: date, month, year)\n"
+    "- endDate (object: date, month, year)\n"
+    "- durationInMonths\n"
+    "- description\n\n"
+    "Return a JSON list of such objects.\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-certification_chain = certification_prompt | llm | certification_parser
-
-
-# Parser
-project_parser = JsonOutputParser(pydantic_object=ProjectItem)
 
 # Prompt
-project_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract details about projects. For each project, return:\n"
-        "- projectName\n"
-        "- startDate (object: date, month, year)\n"
-        "- endDate (object: date, month, year)\n"
-        "- durationInMonths\n"
-        "- description\n"
-        "- organizationName\n"
-        "- location\n"
-        "- type (only one of: own, employment, academic)\n\n"
-        "Return a JSON list of such objects.\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": project_parser.get_format_instructions()}
+project_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract details about projects. For each project, return:\n"
+    "- projectName\n"
+    "- startDate (object: date, month, year)\n"
+    "- endDate (object: date, month, year)\n"
+    "- durationInMonths\n"
+    "- description\n"
+    "- organizationName\n"
+    "- location\n"
+    "- type (only one of: own, employment, academic)\n\n"
+    "Return a JSON list of such objects.\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-project_chain = project_prompt | llm | project_parser
-
-
-# Parser
-parser = JsonOutputParser(pydantic_object=PersonalInfo)
 
 # Prompt
-prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "Extract the following personal information from the resume text:\n"
-        "- firstName, lastName\n"
-        "- email\n"
-        "- mobileNumber (as object: countryCode, number)\n"
-        "- dateOfBirth (as object: date, month, year)\n"
-        "- address, country, state, city, postalCode\n"
-        "- about\n"
-        "- socialUrls (as object: linkedin, github)\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": parser.get_format_instructions()}
+personal_info_template = (
+    "You are a resume parser.\n\n"
+    "Extract the following personal information from the resume text:\n"
+    "- firstName, lastName\n"
+    "- email\n"
+    "- mobileNumber (as object: countryCode, number)\n"
+    "- dateOfBirth (as object: date, month, year)\n"
+    "- address, country, state, city, postalCode\n"
+    "- about\n"
+    "- socialUrls (as object: linkedin, github)\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-# Chain
-chain = prompt | llm | parser
-
-# Parser for skills
-skills_parser = JsonOutputParser(pydantic_object=SkillsItem)
 
 # Prompt for extracting skill-occupation pairs
-skills_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract a list of skills and their corresponding occupations.\n"
-        "Each item should be a pair of:\n"
-        "- skill (e.g., Python)\n"
-        "- occupation (e.g., Software Developer)\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": skills_parser.get_format_instructions()}
+skills_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract a list of skills and their corresponding occupations.\n"
+    "Each item should be a pair of:\n"
+    "- skill (e.g., Python)\n"
+    "- occupation (e.g., Software Developer)\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-skills_chain = skills_prompt | llm | skills_parser
-
-
-
-# Parser
-education_parser = JsonOutputParser(pydantic_object=EducationItem)
 
 # Prompt
-education_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract all education details. For each entry, provide:\n"
-        "- institution\n"
-        "- course (degree or program)\n"
-        "- location\n"
-        "- startDate (object: date, month, year)\n"
-        "- endDate (object: date, month, year)\n"
-        "- description\n\n"
-        "Format output as a JSON list.\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": education_parser.get_format_instructions()}
+education_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract all education details. For each entry, provide:\n"
+    "- institution\n"
+    "- course (degree or program)\n"
+    "- location\n"
+    "- startDate (object: date, month, year)\n"
+    "- endDate (object: date, month, year)\n"
+    "- description\n\n"
+    "Format output as a JSON list.\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-education_chain = education_prompt | llm | education_parser
 
-
-# Parser and prompt
-employment_parser = JsonOutputParser(pydantic_object=EmploymentItem)
-
-employment_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\n"
-        "From the resume text, extract the employment history. For each job, provide:\n"
-        "- organizationName\n"
-        "- durationInMonths\n"
-        "- type (only one of: full_time, part_time, freelance, internship, own)\n"
-        "- location\n"
-        "- startDate (object: date, month, year)\n"
-        "- endDate (object: date, month, year)\n"
-        "- jobTitle\n\n"
-        "Format output as a JSON list.\n\n"
-        "{format_instructions}\n\n"
-        "Resume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": employment_parser.get_format_instructions()}
+employment_template = (
+    "You are a resume parser.\n\n"
+    "From the resume text, extract the employment history. For each job, provide:\n"
+    "- organizationName\n"
+    "- durationInMonths\n"
+    "- type (only one of: full_time, part_time, freelance, internship, own)\n"
+    "- location\n"
+    "- startDate (object: date, month, year)\n"
+    "- endDate (object: date, month, year)\n"
+    "- jobTitle\n\n"
+    "Format output as a JSON list.\n\n"
+    "{format_instructions}\n\n"
+    "Resume text:\n{resume_text}"
 )
 
-employment_chain = employment_prompt | llm | employment_parser
 
 # === Languages Known ===
-language_parser = JsonOutputParser(pydantic_object=LanguageItem)
-language_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\nFrom the resume text, extract languages the person knows. For each language, return:\n"
-        "- language\n- read (true/false)\n- write (true/false)\n- speak (true/false)\n\n"
-        "{format_instructions}\n\nResume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": language_parser.get_format_instructions()}
+language_template = (
+    "You are a resume parser.\n\nFrom the resume text, extract languages the person knows. For each language, return:\n"
+    "- language\n- read (true/false)\n- write (true/false)\n- speak (true/false)\n\n"
+    "{format_instructions}\n\nResume text:\n{resume_text}"
 )
-language_chain = language_prompt | llm | language_parser
 
 
 # === Memberships ===
-membership_parser = JsonOutputParser(pydantic_object=MembershipItem)
-membership_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\nExtract details about professional or academic memberships. For each, include:\n"
-        "- organization\n- durationInMonths\n- location\n- description\n\n"
-        "{format_instructions}\n\nResume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": membership_parser.get_format_instructions()}
+membership_template = (
+    "You are a resume parser.\n\nExtract details about professional or academic memberships. For each, include:\n"
+    "- organization\n- durationInMonths\n- location\n- description\n\n"
+    "{format_instructions}\n\nResume text:\n{resume_text}"
 )
-membership_chain = membership_prompt | llm | membership_parser
 
 
 # === Training ===
-training_parser = JsonOutputParser(pydantic_object=TrainingItem)
-training_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\nExtract training programs attended. For each one, return:\n"
-        "- trainingName\n- organization\n- location\n- startDate (date/month/year)\n- endDate (date/month/year)\n\n"
-        "{format_instructions}\n\nResume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": training_parser.get_format_instructions()}
+training_template = (
+    "You are a resume parser.\n\nExtract training programs attended. For each one, return:\n"
+    "- trainingName\n- organization\n- location\n- startDate (date/month/year)\n- endDate (date/month/year)\n\n"
+    "{format_instructions}\n\nResume text:\n{resume_text}"
 )
-training_chain = training_prompt | llm | training_parser
 
 
 # === Skilling ===
-skilling_parser = JsonOutputParser(pydantic_object=SkillingItem)
-skilling_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\nFrom the resume text, extract skills learned through training. For each skill, include:\n"
-        "- skillingName\n- organization\n- location\n- startDate\n- endDate\n- description\n- durationInMonths\n\n"
-        "{format_instructions}\n\nResume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": skilling_parser.get_format_instructions()}
+skilling_template = (
+    "You are a resume parser.\n\nFrom the resume text, extract skills learned through training. For each skill, include:\n"
+    "- skillingName\n- organization\n- location\n- startDate\n- endDate\n- description\n- durationInMonths\n\n"
+    "{format_instructions}\n\nResume text:\n{resume_text}"
 )
-skilling_chain = skilling_prompt | llm | skilling_parser
 
 
 # === Conferences ===
-conference_parser = JsonOutputParser(pydantic_object=ConferenceItem)
-conference_prompt = PromptTemplate(
-    template=(
-        "You are a resume parser.\n\nExtract all conferences attended. For each, include:\n"
-        "- conferenceName\n- organization\n- location\n- startDate\n- endDate\n- description\n- durationInMonths\n\n"
-        "{format_instructions}\n\nResume text:\n{resume_text}"
-    ),
-    input_variables=["resume_text"],
-    partial_variables={"format_instructions": conference_parser.get_format_instructions()}
+conference_template = (
+    "You are a resume parser.\n\nExtract all conferences attended. For each, include:\n"
+    "- conferenceName\n- organization\n- location\n- startDate\n- endDate\n- description\n- durationInMonths\n\n"
+    "{format_instructions}\n\nResume text:\n{resume_text}"
 )
-conference_chain = conference_prompt | llm | conference_parser
-
 
 
+# Prompt used by extract_skills
+skills_extract_template = "{format_instructions}\n\n{resume_text}"
+
+
+# === Prompt registry ===
+_FORMAT_INSTRUCTIONS = re.compile(r"\{format_instructions\}\n*")
+_WORDS = re.compile(r"\w+")
+
+
+def _listed(name: str, wanted: frozenset) -> bool:
+    # A group of sections only when all of them are
+    return "all" in wanted or all(part in wanted for part in name.split(","))
+
+
+class EntryNotFound(ValueError):
+    """An answer entry whose name is not in the resume text, likely made up."""
+
+
+class Section:
+    """
+    A section prompt and its output schema. The prompt is compiled on first
+    use: the static prefix (instructions and format instructions) is
+    rendered once and each call only appends the resume text, so every call
+    of a section sends the same prompt prefix and the provider's prompt
+    caching can reuse it.
+
+    Sections in STRUCTURED_OUTPUT_SECTIONS send the schema as the model's
+    structured output format instead: the prompt has no format instructions
+    and the answer is validated against the schema, not parsed from free text.
+
+    Sections in SMALL_MODEL_SECTIONS are sent to the small model first, and
+    to the large one only when its answer fails check().
+    """
+
+    def __init__(
+        self, name: str, template: str, schema: type[BaseModel], many: bool = True,
+        structured_template: Optional[str] = None,
+    ):
+        if not template.endswith("{resume_text}"):
+            raise ValueError(f"The {name} prompt must end with the resume text")
+        self.name = name
+        self.template = template
+        self.schema = schema
+        # personal_info returns one object, the other sections a list
+        self.many = many
+        # Prompt used with structured output, when the template is mostly format instructions
+        self.structured_template = structured_template or template
+        self._chains = {}
+
+    @cached_property
+    def structured(self) -> bool:
+        return _listed(self.name, config.STRUCTURED_OUTPUT_SECTIONS)
+
+    @cached_property
+    def models(self) -> tuple[str, ...]:
+        """The models to try, in order."""
+        small = config.LLM_SMALL_MODEL
+        if not small or small == MODEL_NAME or not _listed(self.name, config.SMALL_MODEL_SECTIONS):
+            return (MODEL_NAME,)
+        return (small, MODEL_NAME) if config.MODEL_ESCALATION else (small,)
+
+    @property
+    def model_key(self) -> str:
+        # Part of the cache key, a result of the small model is not one of the large model
+        return "+".join(self.models)
+
+    @cached_property
+    def output_schema(self) -> type[BaseModel]:
+        """The structured output schema, list sections wrapped in an object as the API wants one."""
+        if not self.many:
+            return self.schema
+        return create_model(
+            f"{self.schema.__name__}List",
+            items=(list[self.schema], Field(description=f"Every {self.name} entry of the resume, empty if none")),
+        )
+
+    @cached_property
+    def parser(self):
+        from langchain_core.output_parsers import JsonOutputParser
+
+        return JsonOutputParser(pydantic_object=self.schema)
+
+    @cached_property
+    def prompt(self):
+        from langchain_core.prompts import PromptTemplate
+
+        if self.structured:
+            return PromptTemplate(
+                template=_FORMAT_INSTRUCTIONS.sub("", self.structured_template),
+                input_variables=["resume_text"],
+            )
+        return PromptTemplate(
+            template=self.template,
+            input_variables=["resume_text"],
+            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+        )
+
+    @cached_property
+    def prefix(self) -> str:
+        return self.prompt.format(resume_text="")
+
+    def chain(self, model_name: str = MODEL_NAME):
+        """The chain calling that model, built on first use."""
+        if model_name not in self._chains:
+            self._chains[model_name] = self._build_chain(model_name)
+        return self._chains[model_name]
+
+    def _build_chain(self, model_name: str):
+        from langchain_core.runnables import RunnableLambda
+
+        model = get_llm(model_name)
+        if self.structured:
+            model = model.with_structured_output(self.output_schema, method="json_schema", strict=True)
+        # The async variants keep ainvoke from running these in a thread
+        return (
+            RunnableLambda(self.render, afunc=self._arender)
+            | model
+            | RunnableLambda(self.parse, afunc=self._aparse)
+        )
+
+    def render(self, inputs: dict) -> str:
+        return self.prefix + inputs["resume_text"]
+
+    async def _arender(self, inputs: dict) -> str:
+        return self.render(inputs)
+
+    async def _aparse(self, message):
+        return self.parse(message)
+
+    def parse(self, message):
+        start = time.perf_counter()
+        try:
+            if not self.structured:
+                return self.parser.invoke(message)
+            # Already validated against the schema
+            result = message.model_dump(mode="json")
+            return result["items"] if self.many else result
+        finally:
+            seconds = time.perf_counter() - start
+            PARSE_SECONDS.observe(seconds, section=self.name)
+            record("output_parse", seconds, self.name)
+
+    @cached_property
+    def prefix_tokens(self) -> int:
+        tokens = count_tokens(self.prefix, MODEL_NAME)
+        if self.structured:
+            # The schema is sent along with the prompt
+            tokens += count_tokens(json.dumps(self.output_schema.model_json_schema()), MODEL_NAME)
+        return tokens
+
+    def check(self, result, resume_text: str) -> None:
+        """
+        Raise ValueError when an answer does not match the schema (fields
+        left out count as null), or EntryNotFound when an entry's name, like
+        a certification or language name, shares less than half of its words
+        with the resume text. Used to decide if the large model is needed.
+        """
+        if not self.structured:
+            # Structured output is validated by the API already
+            if self.many:
+                for item in result if isinstance(result, list) else [result]:
+                    self.schema.model_validate(_fill_missing(self.schema, item))
+            else:
+                self.schema.model_validate(_fill_missing(self.schema, result))
+        words = None
+        for model, item in self._entries(result):
+            name_field = _name_field(model)
+            name = item.get(name_field) if name_field else None
+            if not isinstance(name, str) or not name.strip():
+                raise EntryNotFound(f"Entry without a {name_field}")
+            if words is None:
+                words = set(_WORDS.findall(resume_text.lower()))
+            name_words = _WORDS.findall(name.lower())
+            if sum(word in words for word in name_words) * 2 < len(name_words):
+                raise EntryNotFound(f"{name_field} {name!r} is not in the resume")
+
+    def _entries(self, result) -> list[tuple[type[BaseModel], dict]]:
+        # The list entries of the answer: all of them for a list section, the
+        # ones of the list sections for a group, none for personal_info
+        if self.many:
+            return [(self.schema, item) for item in (result if isinstance(result, list) else [result])]
+        entries = []
+        for name, info in self.schema.model_fields.items():
+            value = result.get(name)
+            nested = _nested_model(info.annotation)
+            if nested and isinstance(value, list):
+                entries += [(nested, item) for item in value if isinstance(item, dict)]
+        return entries
+
+    def warm_up(self) -> None:
+        for model_name in self.models:
+            self.chain(model_name)
+        self.prefix_tokens
+
+
+SECTIONS = {
+    "personal_info": Section("personal_info", personal_info_template, PersonalInfo, many=False),
+    "skills": Section("skills", skills_extract_template, SkillsItem, structured_template=skills_template),
+    "education": Section("education", education_template, EducationItem),
+    "employment": Section("employment", employment_template, EmploymentItem),
+    "projects": Section("projects", project_template, ProjectItem),
+    "certifications": Section("certifications", certification_template, CertificationItem),
+    "awards": Section("awards", award_template, AwardItem),
+    "languages": Section("languages", language_template, LanguageItem),
+    "memberships": Section("memberships", membership_template, MembershipItem),
+    "training": Section("training", training_template, TrainingItem),
+    "skilling": Section("skilling", skilling_template, SkillingItem),
+    "conferences": Section("conferences", conference_template, ConferenceItem),
+}
+
+
+# === Personal info without the contact fields found locally ===
+def _nested_model(annotation):
+    # Optional[MobileNumber] -> MobileNumber
+    for arg in get_args(annotation) or (annotation,):
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            return arg
+    return None
+
+
+def _fill_missing(model: type[BaseModel], value):
+    """value with the nullable fields it leaves out set to None, and null lists to [], nested models included."""
+    if not isinstance(value, dict):
+        return value
+    filled = dict(value)
+    for name, info in model.model_fields.items():
+        item = filled.get(name)
+        if item is None:
+            if get_origin(info.annotation) is list:
+                filled[name] = []
+            elif type(None) in get_args(info.annotation):
+                filled[name] = None
+            continue
+        nested = _nested_model(info.annotation)
+        if nested:
+            filled[name] = [_fill_missing(nested, i) for i in item] if isinstance(item, list) else _fill_missing(nested, item)
+    return filled
+
+
+@lru_cache(maxsize=None)
+def _name_field(model: type[BaseModel]) -> Optional[str]:
+    # The first required text field names the entry: certificationName, language, ...
+    for name, info in model.model_fields.items():
+        if info.annotation is str:
+            return name
+    return None
+
+
+def _without(model: type[BaseModel], paths: frozenset, prefix: str = "") -> type[BaseModel]:
+    """A copy of model without the fields at the dotted paths."""
+    fields = {}
+    for name, info in model.model_fields.items():
+        path = prefix + name
+        if path in paths:
+            continue
+        nested = _nested_model(info.annotation)
+        if nested and any(p.startswith(path + ".") for p in paths):
+            nested = _without(nested, paths, path + ".")
+            if not nested.model_fields:
+                continue
+            fields[name] = (Optional[nested], Field(description=info.description))
+        else:
+            fields[name] = (info.annotation, info)
+    return create_model(model.__name__, **fields)
+
+
+@lru_cache(maxsize=None)
+def personal_info_section(resolved: frozenset = frozenset()) -> Section:
+    """The personal_info section asking only for the fields that are not resolved yet."""
+    if not resolved:
+        return SECTIONS["personal_info"]
+    model = _without(PersonalInfo, resolved)
+    lines = []
+    for name, info in model.model_fields.items():
+        nested = _nested_model(info.annotation)
+        lines.append(f"- {name} (as object: {', '.join(nested.model_fields)})\n" if nested else f"- {name}\n")
+    template = (
+        "You are a resume parser.\n\n"
+        "Extract the following personal information from the resume text:\n"
+        + "".join(lines)
+        + "\n{format_instructions}\n\n"
+        "Resume text:\n{resume_text}"
+    )
+    return Section("personal_info", template, model, many=False)
+
+
+# === All sections in one call ===
+# section -> (schema type, what to extract)
+ALL_SECTIONS = {
+    "personal_info": (Optional[PersonalInfo], "Personal information: name, contact details, date of birth, address, about and social URLs"),
+    "skills": (list[SkillsItem], "Skills, each mapped to the most relevant occupation title"),
+    "education": (list[EducationItem], "Education history"),
+    "employment": (list[EmploymentItem], "Employment history"),
+    "projects": (list[ProjectItem], "Projects"),
+    "certifications": (list[CertificationItem], "Certifications"),
+    "awards": (list[AwardItem], "Awards or honors received"),
+    "languages": (list[LanguageItem], "Languages the person knows"),
+    "memberships": (list[MembershipItem], "Professional or academic memberships"),
+    "training": (list[TrainingItem], "Training programs attended"),
+    "skilling": (list[SkillingItem], "Skills learned through training"),
+    "conferences": (list[ConferenceItem], "Conferences attended"),
+}
+
+
+def section_groups(group_count: int = 1) -> list[tuple[str, ...]]:
+    """Split ALL_SECTIONS, in priority order, into group_count similar sized groups."""
+    sections = list(ALL_SECTIONS)
+    group_count = max(1, min(group_count, len(sections)))
+    size, extra = divmod(len(sections), group_count)
+    groups, start = [], 0
+    for i in range(group_count):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(tuple(sections[start:end]))
+        start = end
+    return groups
+
+
+@lru_cache(maxsize=None)
+def section_group(sections: tuple[str, ...]) -> Section:
+    group_model = create_model(
+        "ResumeSections",
+        **{name: (ALL_SECTIONS[name][0], Field(description=ALL_SECTIONS[name][1])) for name in sections}
+    )
+    template = (
+        "You are a resume parser.\n\n"
+        "From the resume text, extract the following sections into one JSON object. "
+        "Use null or an empty list for sections that are not in the resume.\n"
+        + "".join(f"- {name}: {ALL_SECTIONS[name][1]}\n" for name in sections)
+        + "\n{format_instructions}\n\n"
+        "Resume text:\n{resume_text}"
+    )
+    return Section(",".join(sections), template, group_model, many=False)
+
+
+async def _invoke(section: Section, resume_text: str):
+    """
+    Run a section on its models in turn: an answer of the small model that
+    fails section.check() is asked again from the large one.
+    """
+    *first, last = section.models
+    for model_name in first:
+        try:
+            result = await _call(section, model_name, resume_text)
+            section.check(result, resume_text)
+            return result
+        except ValueError as e:
+            # Invalid JSON, schema mismatch or an entry not in the resume
+            reason = "not_found" if isinstance(e, EntryNotFound) else "invalid"
+            LLM_ESCALATIONS.inc(section=section.name, reason=reason)
+            ledger = current_usage()
+            if ledger is not None:
+                ledger.escalate(section.name, model_name, f"{reason}: {str(e).splitlines()[0][:200]}")
+    return await _call(section, last, resume_text)
+
+
+async def _call(section: Section, model_name: str, resume_text: str):
+    """
+    Run a section chain through the rate-limited client (app/llm_client.py),
+    recording its prompt tokens and reported usage for the current request.
+    """
+    ledger = current_usage()
+    if ledger is None:
+        prompt_tokens = section.prefix_tokens + await count_tokens_async(resume_text, MODEL_NAME)
+        run_config = None
+    else:
+        prompt_tokens = section.prefix_tokens + await ledger.text_tokens(resume_text)
+        ledger.add_prompt(section.name, prompt_tokens, model_name)
+        run_config = {"callbacks": [ledger.callback(section.name, model_name)]}
+    chain = section.chain(model_name)
+    start = time.perf_counter()
+    try:
+        with LLM_IN_FLIGHT.track(section=section.name):
+            return await get_client().call(
+                lambda: chain.ainvoke({"resume_text": resume_text}, config=run_config), prompt_tokens
+            )
+    finally:
+        seconds = time.perf_counter() - start
+        LLM_SECONDS.observe(seconds, section=section.name, model=model_name)
+        record("llm", seconds, section.name)
+
+
+def _cached(section: str):
+    # The prompt prefix is the prompt version, read on the first call
+    return cache_section(section, SECTIONS[section].model_key, lambda: SECTIONS[section].prefix)
 
 
 # Function to call in FastAPI
-async def extract_personal_info(resume_text: str) -> dict:
-    result = await chain.ainvoke({"resume_text": resume_text})
-    return result
-
-
+async def extract_personal_info(resume_text: str, contacts: Optional[dict] = None) -> dict:
+    """
+    Personal info. Email, phone and social URLs are found with regexes first
+    (or passed in as contacts) and the LLM is only asked for the rest.
+    """
+    if contacts is None:
+        contacts = find_contacts(resume_text) if config.CONTACT_FAST_PATH else {}
+    section = personal_info_section(resolved_fields(contacts))
+    # The prompt prefix tells apart the variants asking for fewer fields
+    key = section_key(resume_text, section.name, section.model_key, section.prefix)
+    result = await cached_call(key, lambda: _invoke(section, resume_text))
+    return merge_contacts(result, contacts) if contacts else result
+
+
+@_cached("skills")
 async def extract_skills(resume_text: str) -> list[dict]:
-    results = []
-    # Since the parser expects 1 object per call, we’ll call it multiple times or parse JSON list from LLM
-    # Better way: ask LLM to return a full list matching the schema
-    prompt = (
-        "Extract a list of skills and map each skill to the most relevant occupation title (like in O*NET).\n"
-        "Return a list of objects like this:\n"
-        "[{\"skill\": \"Python\", \"occupation\": \"Software Developer\"}, ...]\n\n"
-        f"Resume text:\n{resume_text}"
-    )
-    full_prompt = PromptTemplate(
-        template="{format_instructions}\n\n{resume_text}",
-        input_variables=["resume_text"],
-        partial_variables={"format_instructions": skills_parser.get_format_instructions()}
-    )
-    chain = full_prompt | llm | skills_parser
-    result = await chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["skills"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 
+@_cached("education")
 async def extract_education(resume_text: str) -> list[dict]:
-    result = await education_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["education"], resume_text)
     return [result] if isinstance(result, dict) else result
 
+@_cached("employment")
 async def extract_employment_history(resume_text: str) -> list[dict]:
-    result = await employment_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["employment"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 # Async function
+@_cached("projects")
 async def extract_projects(resume_text: str) -> list[dict]:
-    result = await project_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["projects"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 # Async function
+@_cached("certifications")
 async def extract_certifications(resume_text: str) -> list[dict]:
-    result = await certification_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["certifications"], resume_text)
     return [result] if isinstance(result, dict) else result
 
+@_cached("awards")
 async def extract_awards(resume_text: str) -> list[dict]:
-    result = await award_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["awards"], resume_text)
     return [result] if isinstance(result, dict) else result
 
+@_cached("languages")
 async def extract_languages(resume_text: str) -> list[dict]:
-    result = await language_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["languages"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 
+@_cached("memberships")
 async def extract_memberships(resume_text: str) -> list[dict]:
-    result = await membership_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["memberships"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 
+@_cached("training")
 async def extract_training(resume_text: str) -> list[dict]:
-    result = await training_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["training"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 
+@_cached("skilling")
 async def extract_skilling(resume_text: str) -> list[dict]:
-    result = await skilling_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["skilling"], resume_text)
     return [result] if isinstance(result, dict) else result
 
 
+@_cached("conferences")
 async def extract_conferences(resume_text: str) -> list[dict]:
-    result = await conference_chain.ainvoke({"resume_text": resume_text})
+    result = await _invoke(SECTIONS["conferences"], resume_text)
     return [result] if isinstance(result, dict) else result
+
+
+async def extract_section_group(resume_text: str, sections: tuple[str, ...]) -> dict:
+    """Extract several sections with a single LLM call."""
+    group = section_group(sections)
+    key = section_key(resume_text, group.name, group.model_key, group.prefix)
+    return await cached_call(key, lambda: _extract_section_group(group, resume_text, sections))
+
+
+async def _extract_section_group(group: Section, resume_text: str, sections: tuple[str, ...]) -> dict:
+    result = await _invoke(group, resume_text)
+    if not isinstance(result, dict):
+        raise ValueError("Expected a JSON object with one key per section")
+    extracted = {}
+    for name in sections:
+        value = result.get(name)
+        if name == "personal_info":
+            extracted[name] = value
+        elif value is None:
+            extracted[name] = []
+        else:
+            extracted[name] = [value] if isinstance(value, dict) else value
+    return extracted
+
+
+# Sections extracted by each priority endpoint
+FIRST_PRIORITY = {
+    "personal_info": extract_personal_info,
+    "skills": extract_skills,
+    "education": extract_education,
+    "employment": extract_employment_history,
+}
+
+SECOND_PRIORITY = {
+    "projects": extract_projects,
+    "certifications": extract_certifications,
+    "awards": extract_awards,
+    "languages": extract_languages,
+}
+
+THIRD_PRIORITY = {
+    "memberships": extract_memberships,
+    "training": extract_training,
+    "skilling": extract_skilling,
+    "conferences": extract_conferences,
+}
+
+PRIORITY_PRESETS = {
+    "first": FIRST_PRIORITY,
+    "second": SECOND_PRIORITY,
+    "third": THIRD_PRIORITY,
+}
+
+# Every section extractor, in priority order
+EXTRACTORS = {**FIRST_PRIORITY, **SECOND_PRIORITY, **THIRD_PRIORITY}
+
+
+def select_extractors(names: list[str]) -> dict:
+    """
+    Extractors of the named sections, in priority order. Preset names
+    (first, second, third) stand for their sections. Raises ValueError on
+    an unknown name.
+    """
+    wanted = set()
+    for name in names:
+        name = name.strip()
+        if name in PRIORITY_PRESETS:
+            wanted.update(PRIORITY_PRESETS[name])
+        elif name in EXTRACTORS:
+            wanted.add(name)
+        elif name:
+            raise ValueError(f"Unknown section {name!r}, use: {', '.join([*PRIORITY_PRESETS, *EXTRACTORS])}")
+    if not wanted:
+        raise ValueError("No sections selected")
+    return {name: extractor for name, extractor in EXTRACTORS.items() if name in wanted}
+
+
+def priority_of(sections) -> str:
+    """The highest priority preset among the sections, which their request is queued at."""
+    for preset, extractors in PRIORITY_PRESETS.items():
+        if any(name in extractors for name in sections):
+            return preset
+    return "third"
+
+
+def warm_up() -> None:
+    """Build the chat models and the section chains now instead of on the first requests."""
+    for section in SECTIONS.values():
+        section.warm_up()
+    for group in section_groups(config.PARSE_ALL_GROUPS):
+        section_group(group).warm_up()
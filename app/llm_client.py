@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from app import config
+from app.metrics import QUEUE_REJECTED, record
+from app.scheduler import Overloaded, WeightedSlots, current_priority
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+def http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Sync and async HTTP clients with the configured connection pool, shared by all LLM calls."""
+    timeout = httpx.Timeout(config.LLM_HTTP_TIMEOUT_SECONDS or None)
+    return (
+        httpx.Client(limits=http_limits(), timeout=timeout),
+        httpx.AsyncClient(limits=http_limits(), timeout=timeout),
+    )
+
+
+class TokenBucket:
+    """Waits until the estimated tokens of a call fit in the per-minute budget."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0  # tokens per second
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited_seconds = 0.0
+        # Callers are served in arrival order
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int) -> None:
+        # A call bigger than the whole bucket waits for a full bucket
+        tokens = min(float(tokens), self.capacity)
+        async with self._lock:
+            start = time.monotonic()
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+            self.waited_seconds += time.monotonic() - start
+
+    def drain(self) -> None:
+        # After a 429 the provider's window is full, whatever our estimate says
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class AdaptiveLimiter(WeightedSlots):
+    """
+    AIMD concurrency limit: grows by one after limit successful calls and
+    halves on a 429 or a call slower than the target latency, at most once
+    per cooldown so one burst of 429s only halves it once. Calls waiting for
+    a slot are queued per priority (see WeightedSlots).
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, target_latency: float = 0.0,
+        weights: Optional[dict[str, float]] = None,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        super().__init__(min(max(initial, self.minimum), self.maximum), weights, "llm")
+        self.target_latency = target_latency
+        self.decreases = 0
+        self._cooldown = target_latency or 1.0
+        self._last_decrease = 0.0
+
+    def release(self, priority: str = "first", latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """latency is None for calls that failed or were cancelled, they do not move the limit."""
+        slow = bool(self.target_latency and latency is not None and latency > self.target_latency)
+        if overloaded or slow:
+            now = time.monotonic()
+            if now - self._last_decrease >= self._cooldown:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+                self.decreases += 1
+        elif latency is not None:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        super().release(priority, latency)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "response", None), httpx.Response):
+        status = error.response.status_code
+    return status
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx, timeouts and connection errors."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, httpx.TransportError):
+        return True
+    # Imported here, the SDK is slow to import and the fake backend does not need it
+    import openai
+
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from the Retry-After headers of a 429 response, if any."""
+    response = getattr(error, "response", None)
+    if not isinstance(response, httpx.Response):
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class LLMClient:
+    """
+    Runs LLM calls through the token bucket and the adaptive concurrency
+    limit, retrying 429s, 5xx, timeouts and connection errors with full
+    jitter exponential backoff.
+    """
+
+    def __init__(self):
+        self.bucket = TokenBucket(config.LLM_TOKENS_PER_MINUTE) if config.LLM_TOKENS_PER_MINUTE else None
+        self.limiter = AdaptiveLimiter(
+            config.LLM_INITIAL_CONCURRENCY,
+            config.LLM_MIN_CONCURRENCY,
+            config.LLM_MAX_CONCURRENCY,
+            config.LLM_TARGET_LATENCY_SECONDS,
+            config.PRIORITY_WEIGHTS,
+        )
+        self.max_retries = config.LLM_MAX_RETRIES
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        # priority -> {"calls", "wait_seconds", "max_wait_seconds", "rejected"}
+        self.queue_stats: dict[str, dict] = {}
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(config.LLM_RETRY_MAX_SECONDS, config.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+        # Never retry sooner than the provider asked
+        return max(delay, min(retry_after(error) or 0.0, config.LLM_RETRY_MAX_SECONDS))
+
+    def _queue_stats(self, priority: str) -> dict:
+        return self.queue_stats.setdefault(
+            priority, {"calls": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "rejected": {429: 0, 503: 0}}
+        )
+
+    def admit(self, priority: str) -> None:
+        """
+        Raise Overloaded for a new request of the priority when its queue of
+        LLM calls is full (429) or has not moved for its max wait (503).
+        Requests already admitted keep their place in the queue.
+        """
+        if not config.ADMISSION_CONTROL:
+            return
+        max_queue = config.PRIORITY_MAX_QUEUE.get(priority, 0)
+        max_wait = config.PRIORITY_MAX_WAIT_SECONDS.get(priority, 0)
+        if max_queue and self.limiter.queued(priority) >= max_queue:
+            status, message = 429, f"Too many {priority} priority requests queued, retry later."
+        elif max_wait and self.limiter.oldest_wait(priority) > max_wait:
+            status, message = 503, f"The {priority} priority queue is saturated, retry later."
+        else:
+            return
+        self._queue_stats(priority)["rejected"][status] += 1
+        QUEUE_REJECTED.inc(priority=priority, status=status)
+        raise Overloaded(message, status, max(1, math.ceil(self.limiter.estimated_wait(priority))))
+
+    async def call(self, make_call: Callable[[], Awaitable[T]], prompt_tokens: int = 0) -> T:
+        """Run make_call(), a fresh coroutine per attempt, within the rate limits."""
+        priority = current_priority()
+        attempt = 0
+        while True:
+            if self.bucket is not None and prompt_tokens:
+                await self.bucket.acquire(prompt_tokens)
+            waited = await self.limiter.acquire(priority)
+            queue_stats = self._queue_stats(priority)
+            queue_stats["calls"] += 1
+            queue_stats["wait_seconds"] += waited
+            queue_stats["max_wait_seconds"] = max(queue_stats["max_wait_seconds"], waited)
+            record("llm_queue", waited)
+            self.calls += 1
+            start = time.monotonic()
+            latency, overloaded = None, False
+            try:
+                result = await make_call()
+                latency = time.monotonic() - start
+                return result
+            except Exception as e:
+                overloaded = is_rate_limited(e)
+                if overloaded:
+                    self.rate_limited += 1
+                    if self.bucket is not None:
+                        self.bucket.drain()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                error = e
+            finally:
+                self.limiter.release(priority, latency, overloaded)
+
+            delay = self.backoff(attempt, error)
+            attempt += 1
+            self.retries += 1
+            logger.info("LLM call failed (%s), retry %s in %.2fs", error.__class__.__name__, attempt, delay)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "limit_decreases": self.limiter.decreases,
+            "bucket_tokens": round(self.bucket.tokens) if self.bucket else None,
+            "bucket_wait_seconds": round(self.bucket.waited_seconds, 3) if self.bucket else 0.0,
+            "queues": {
+                priority: {
+                    "weight": self.limiter.weight(priority),
+                    "queued": self.limiter.queued(priority),
+                    "running": self.limiter.running.get(priority, 0),
+                    "oldest_wait_seconds": round(self.limiter.oldest_wait(priority), 3),
+                    "calls": stats["calls"],
+                    "mean_wait_seconds": round(stats["wait_seconds"] / stats["calls"], 4) if stats["calls"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 4),
+                    "rejected": stats["rejected"],
+                }
+                for priority, stats in sorted(self.queue_stats.items())
+            },
+        }
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_client() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
@@ -1,172 +1,419 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-import shutil
-import os
-from app.parser import extract_text
-from app.llm import extract_personal_info, extract_training
-from app.llm import extract_skills, extract_memberships
-from app.llm import extract_education, extract_languages
-from app.llm import extract_employment_history, extract_awards
-from app.llm import extract_projects, extract_certifications
-from app.llm import extract_skilling, extract_conferences
-from app.utils import count_tokens, estimate_cost
-
-from fastapi import UploadFile, File, HTTPException
-from app.parser import extract_text
-from app.llm import (
-    extract_memberships,
-    extract_training,
-    extract_skilling,
-    extract_conferences
-)
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.formparsers import MultiPartParser
+from functools import partial
+from typing import List, Optional, Union
+import asyncio
+import json
+import logging
+import zipfile
+from app import config, llm, workers
+from app.llm import FIRST_PRIORITY, SECOND_PRIORITY, THIRD_PRIORITY, EXTRACTORS, select_extractors
+from app.llm import ALL_SECTIONS, SECTIONS
+from app.llm import section_groups, section_group, extract_section_group, priority_of
+from app.tokens import count_tokens, start_usage
+from app.pipeline import RESPONSE_KEYS, Document, build_meta, build_response, load_document, route_sections, routed_texts
+from app import documents, jobs
+from app.ingest import RequestSizeLimit, UploadError, detect_upload, read_limited
+from app.runner import run_sections, iter_sections
+from app.cache import get_cache, get_single_flight
+from app.llm_client import get_client
+from app.scheduler import Overloaded, start_priority
+from app import metrics
+from app.metrics import start_timings, timed
 
 import time
-from datetime import datetime
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
-@app.post("/parse-resume")
-async def parse_resume_important_info(file: UploadFile = File(...)):
-    start_time = time.time()  # start timer
+# Uploads bigger than this are spooled to a temporary file while they are received
+MultiPartParser.spool_max_size = config.UPLOAD_SPOOL_MAX_BYTES
+# Oversized request bodies are cut off while they are received, not after
+app.add_middleware(RequestSizeLimit)
 
-    file_ext = file.filename.split(".")[-1].lower()
-    if file_ext not in ["pdf", "docx"]:
-        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported.")
 
-    temp_file_path = f"temp_upload.{file_ext}"
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        with metrics.HTTP_IN_FLIGHT.track():
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, so /batch/{job_id} is one series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(route=route, status=status)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, route=route)
 
+
+# Filled in by the background warm-up, GET /ready answers 503 until it is done
+warm_up_state = {"ready": False, "seconds": None, "error": None}
+
+
+async def warm_up():
+    """
+    Start the extraction workers, then import langchain and build the LLM
+    chains, off the event loop. The app serves requests meanwhile, they
+    build what they need on first use.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
     try:
-        raw_text = extract_text(temp_file_path, file_ext)
+        # One after the other: forking the workers while another thread
+        # imports modules can leave them holding an import lock
+        await loop.run_in_executor(None, workers.warm_up)
+        await loop.run_in_executor(None, llm.warm_up)
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        warm_up_state["error"] = str(e)
+    else:
+        warm_up_state["ready"] = True
+    warm_up_state["seconds"] = round(time.perf_counter() - start, 3)
+
+
+@app.on_event("startup")
+async def startup():
+    app.state.warm_up = asyncio.create_task(warm_up())
+    jobs.resume_unfinished_jobs()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    workers.shutdown()
+
+
+async def read_upload(file: UploadFile) -> tuple[bytes, str]:
+    """
+    Read the upload up to UPLOAD_MAX_BYTES and return its bytes and file
+    type, sniffed from the content since the filename can say anything.
+    """
+    with timed("upload"):
+        data = await read_limited(file, config.UPLOAD_MAX_BYTES)
+    try:
+        return data, detect_upload(file.filename, data)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+async def read_resume_text(file: UploadFile) -> Document:
+    """Validate the upload and return the document, extracted off the event loop."""
+    return await extract_upload(*await read_upload(file))
+
+
+async def extract_upload(data: bytes, file_ext: str) -> Document:
+    try:
+        return await load_document(data, file_ext)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Text extraction took too long.")
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        os.remove(temp_file_path)
 
-    personal_info = await extract_personal_info(raw_text)
-    skills = await extract_skills(raw_text)
-    education =await extract_education(raw_text)
-    employment = await extract_employment_history(raw_text)
 
-    char_count = len(raw_text)
-    token_count = count_tokens(raw_text, model_name="gpt-4o")
-    cost_estimate = estimate_cost(token_count)
-    processing_time = round(time.time() - start_time, 2)  # in seconds
-    timestamp = datetime.utcnow().isoformat() + "Z"  # current UTC time
+def admit(sections) -> str:
+    """
+    The priority of a request for these sections. Requests of a saturated
+    priority are turned away with 429/503 and a Retry-After before any
+    text is extracted.
+    """
+    priority = priority_of(sections)
+    try:
+        get_client().admit(priority)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return priority
 
-    return {
-        "personal_info": personal_info,
-        "skills": skills,
-        "education": education,
-        "employment": employment,
-        "raw_text_preview": raw_text[:1000],
-         "meta": {
-            "char_count": char_count,
-            "token_count": token_count,
-            "estimated_cost_usd": cost_estimate,
-            "processing_time_seconds": processing_time,
-            "model_used": "gpt-4o",
-            "timestamp": timestamp
-        }
-    }
 
+async def stored_document(document_id: str) -> Document:
+    document = await asyncio.to_thread(documents.get_store().get, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired.")
+    return document
 
 
+async def parse_sections(source: Union[UploadFile, str], extractors: dict) -> dict:
+    """Parse an upload, or a stored document by its ID."""
+    start_time = time.time()  # start timer
+    start_timings()
+    start_priority(admit(extractors))
 
+    document = await stored_document(source) if isinstance(source, str) else await read_resume_text(source)
+    extractors, routing = route_sections(document, extractors)
+    start_usage()
+    sections, errors = await run_sections(document.text, extractors)
+    return await build_response(document, sections, errors, start_time, **routing)
 
-@app.post("/parse-second-priority")
-async def parse_projects_and_certs(file: UploadFile = File(...)):
+
+async def stream_sections(source: Union[UploadFile, str], extractors: dict) -> StreamingResponse:
+    """
+    NDJSON response: one JSON object per line, each holding one key of the
+    regular response. raw_text_preview comes first, then the contact fields
+    found without the LLM as a partial personal_info, then every section as
+    soon as it is extracted, and meta last.
+    """
     start_time = time.time()  # start timer
+    timings = start_timings()
+    priority = admit(extractors)
+    start_priority(priority)
+
+    document = await stored_document(source) if isinstance(source, str) else await read_resume_text(source)
+    routed, routing = route_sections(document, extractors)
 
-    file_ext = file.filename.split(".")[-1].lower()
-    if file_ext not in ["pdf", "docx"]:
-        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported.")
+    async def lines():
+        start_timings(timings)
+        start_priority(priority)
+        yield json.dumps({"raw_text_preview": document.text[:1000]}) + "\n"
+        if "personal_info" in extractors and document.contacts:
+            yield json.dumps({"personal_info": document.contacts}) + "\n"
+        start_usage()
+        errors = {}
+        async for name, result, error in iter_sections(document.text, routed):
+            if error:
+                errors[name] = error
+            yield json.dumps({RESPONSE_KEYS.get(name, name): result}) + "\n"
+        yield json.dumps({"meta": await build_meta(document, start_time, errors, **routing)}) + "\n"
 
-    temp_file_path = f"temp_upload.{file_ext}"
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the extraction workers and LLM chains are warmed up, 503 before."""
+    return JSONResponse(warm_up_state, status_code=200 if warm_up_state["ready"] else 503)
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {**await asyncio.to_thread(get_cache().stats), "single_flight": get_single_flight().stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/llm-stats")
+async def llm_stats():
+    return {**get_client().stats(), "extraction_queues": workers.queue_stats()}
+
+
+def requested_sections(sections: str) -> dict:
     try:
-        raw_text = extract_text(temp_file_path, file_ext)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        os.remove(temp_file_path)
+        return select_extractors(sections.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    projects = await extract_projects(raw_text)
-    certifications = await extract_certifications(raw_text)
-    awards = await extract_awards(raw_text)
-    languages = await extract_languages(raw_text)
-    
 
-    # meta 
-    char_count = len(raw_text)
-    token_count = count_tokens(raw_text, model_name="gpt-4o")
-    cost_estimate = estimate_cost(token_count)
-    processing_time = round(time.time() - start_time, 2)  # in seconds
-    timestamp = datetime.utcnow().isoformat() + "Z"  # current UTC time
+@app.post("/parse")
+async def parse_resume(
+    file: UploadFile = File(...),
+    sections: str = Query(",".join(EXTRACTORS), description="Comma separated sections or presets (first, second, third)"),
+    stream: bool = Query(False, description="Stream the sections as NDJSON"),
+):
+    """Extract the text once and run only the requested section chains."""
+    extractors = requested_sections(sections)
+    if stream:
+        return await stream_sections(file, extractors)
+    return await parse_sections(file, extractors)
 
-    return {
-        "projects": projects,
-        "certifications": certifications,
-        "awards": awards,
-        "extract_languages": languages,
-        "raw_text_preview": raw_text[:1000],
-        "meta": {
-            "char_count": char_count,
-            "token_count": token_count,
-            "estimated_cost_usd": cost_estimate,
-            "processing_time_seconds": processing_time,
-            "model_used": "gpt-4o",
-            "timestamp": timestamp
-        }
-    }
+
+@app.post("/documents")
+async def upload_document(file: UploadFile = File(...)):
+    """
+    Store a resume and its extracted text, then parse it by ID with
+    POST /documents/{document_id}/parse as often as needed.
+    """
+    data, file_ext = await read_upload(file)
+    store = documents.get_store()
+    # Uploading a stored file again only renews its TTL. The file is written
+    # from a thread so a large upload does not stall the event loop.
+    document = await asyncio.to_thread(store.get, store.document_id(data, file_ext))
+    document = document or await extract_upload(data, file_ext)
+    info = await asyncio.to_thread(store.put, file.filename, file_ext, data, document)
+    return {**info, "extraction": document.extraction}
+
+
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str):
+    info = await asyncio.to_thread(documents.get_store().info, document_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired.")
+    return info
+
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    if not await asyncio.to_thread(documents.get_store().delete, document_id):
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return {"document_id": document_id, "deleted": True}
+
+
+@app.post("/documents/{document_id}/parse")
+async def parse_stored_document(
+    document_id: str,
+    sections: str = Query(",".join(EXTRACTORS), description="Comma separated sections or presets (first, second, third)"),
+    stream: bool = Query(False, description="Stream the sections as NDJSON"),
+):
+    """Same as /parse, for a document uploaded to /documents."""
+    extractors = requested_sections(sections)
+    if stream:
+        return await stream_sections(document_id, extractors)
+    return await parse_sections(document_id, extractors)
+
+
+# Presets of /parse
+@app.post("/parse-resume")
+async def parse_resume_important_info(file: UploadFile = File(...)):
+    return await parse_sections(file, FIRST_PRIORITY)
+
+
+@app.post("/parse-second-priority")
+async def parse_projects_and_certs(file: UploadFile = File(...)):
+    return await parse_sections(file, SECOND_PRIORITY)
 
 
 @app.post("/parse-third-priority")
 async def parse_membership_training_skilling_conference(file: UploadFile = File(...)):
-    start_time = time.time()  # start timer
+    return await parse_sections(file, THIRD_PRIORITY)
 
-    file_ext = file.filename.split(".")[-1].lower()
-    if file_ext not in ["pdf", "docx"]:
-        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported.")
 
-    temp_file_path = f"temp_upload.{file_ext}"
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+@app.post("/parse-resume/stream")
+async def stream_resume_important_info(file: UploadFile = File(...)):
+    return await stream_sections(file, FIRST_PRIORITY)
+
+
+@app.post("/parse-second-priority/stream")
+async def stream_projects_and_certs(file: UploadFile = File(...)):
+    return await stream_sections(file, SECOND_PRIORITY)
 
-    try:
-        raw_text = extract_text(temp_file_path, file_ext)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        os.remove(temp_file_path)
 
-    # Resume processing
-    memberships = await extract_memberships(raw_text)
-    training = await extract_training(raw_text)
-    skilling = await extract_skilling(raw_text)
-    conferences = await extract_conferences(raw_text)
+@app.post("/parse-third-priority/stream")
+async def stream_membership_training_skilling_conference(file: UploadFile = File(...)):
+    return await stream_sections(file, THIRD_PRIORITY)
 
-    # Metadata
-    char_count = len(raw_text)
-    token_count = count_tokens(raw_text, model_name="gpt-4o")
-    cost_estimate = estimate_cost(token_count)
-    processing_time = round(time.time() - start_time, 2)  # in seconds
-    timestamp = datetime.utcnow().isoformat() + "Z"  # current UTC time
 
+def token_savings(document: Document, groups: list[tuple[str, ...]], sections: dict) -> dict:
+    """
+    Tokens of the grouped /parse-all calls compared with one call per section
+    as /parse makes them: each section sent only its routed blocks, and the
+    ones very likely absent not called.
+    """
+    text_tokens = count_tokens(document.text)
+    routed = {name: text for name, text in routed_texts(document, ALL_SECTIONS).items() if text is not None}
+    per_section_input = sum(SECTIONS[name].prefix_tokens + count_tokens(text) for name, text in routed.items())
+    grouped_input = sum(section_group(group).prefix_tokens + text_tokens for group in groups)
+    # Output is estimated from the returned JSON, serialized per section and per group
+    per_section_output = sum(count_tokens(json.dumps(sections[name])) for name in routed)
+    grouped_output = sum(
+        count_tokens(json.dumps({name: sections[name] for name in group})) for group in groups
+    )
     return {
-        "memberships": memberships,
-        "training": training,
-        "skilling": skilling,
-        "conferences": conferences,
-        "raw_text_preview": raw_text[:1000],
-        "meta": {
-            "char_count": char_count,
-            "token_count": token_count,
-            "estimated_cost_usd": cost_estimate,
-            "processing_time_seconds": processing_time,
-            "model_used": "gpt-4o",
-            "timestamp": timestamp
-        }
+        "llm_calls": len(groups),
+        "llm_calls_per_section_path": len(routed),
+        "input_tokens": grouped_input,
+        "input_tokens_per_section_path": per_section_input,
+        "input_tokens_saved": per_section_input - grouped_input,
+        "output_tokens": grouped_output,
+        "output_tokens_per_section_path": per_section_output,
+        "output_tokens_saved": per_section_output - grouped_output,
     }
+
+
+@app.post("/parse-all")
+async def parse_all_sections(file: UploadFile = File(...), groups: Optional[int] = Query(None, ge=1, le=12)):
+    start_time = time.time()  # start timer
+    start_timings()
+    start_priority(admit(ALL_SECTIONS))
+
+    document = await read_resume_text(file)
+    raw_text = document.text
+
+    # One LLM call per group of sections
+    start_usage()
+    section_group_list = section_groups(groups or config.PARSE_ALL_GROUPS)
+    # A group's answer holds all of its sections, so it gets the time of as many section calls
+    timeout = config.SECTION_TIMEOUT_SECONDS * max(len(group) for group in section_group_list)
+    results, group_errors = await run_sections(raw_text, {
+        ",".join(group): partial(extract_section_group, sections=group) for group in section_group_list
+    }, timeout=timeout)
+    sections, errors = {}, {}
+    for group in section_group_list:
+        key = ",".join(group)
+        for name in group:
+            if key in group_errors:
+                sections[name] = None if name == "personal_info" else []
+                errors[name] = group_errors[key]
+            else:
+                sections[name] = results[key][name]
+
+    # Groups span many sections, so they get the full text instead of routed blocks
+    # Tokenizes the text and result of every section, in a thread
+    savings = await asyncio.to_thread(token_savings, document, section_group_list, sections)
+    return await build_response(
+        document, {name: sections[name] for name in ALL_SECTIONS}, errors, start_time,
+        token_savings=savings,
+    )
+
+
+@app.post("/batch")
+async def create_batch_job(
+    files: List[UploadFile] = File(...),
+    sections: str = Query("first", description="Comma separated sections or presets (first, second, third)"),
+):
+    """
+    Queue many resumes (PDF/DOCX files or ZIP archives of them) and return a
+    job id to poll. sections takes the same sections and presets as /parse.
+    """
+    try:
+        select_extractors(sections.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    batch_files = []
+    for file in files:
+        try:
+            # What ZIP archives unpack to counts against the batch limits, not their packed size
+            unpacked = sum(len(data) for *_, data in batch_files)
+            if config.BATCH_MAX_BYTES and unpacked >= config.BATCH_MAX_BYTES:
+                raise UploadError(f"The batch unpacks to more than {config.BATCH_MAX_BYTES} bytes.", 413)
+            if config.BATCH_MAX_FILES and len(batch_files) >= config.BATCH_MAX_FILES:
+                raise UploadError(f"The batch holds more than {config.BATCH_MAX_FILES} files.", 413)
+            batch_files.extend(jobs.expand_upload(
+                file.filename, await read_limited(file, config.BATCH_MAX_BYTES),
+                max_bytes=config.BATCH_MAX_BYTES and config.BATCH_MAX_BYTES - unpacked,
+                max_files=config.BATCH_MAX_FILES and config.BATCH_MAX_FILES - len(batch_files),
+            ))
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except (ValueError, zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not batch_files:
+        raise HTTPException(status_code=400, detail="No PDF or DOCX files found in the upload.")
+
+    # Writing up to BATCH_MAX_BYTES to SQLite would stall every other request on the event loop
+    store = jobs.get_store()
+    job_id = await asyncio.to_thread(store.create, sections, batch_files, jobs.owner())
+    jobs.start_job(job_id)
+    return await asyncio.to_thread(store.get, job_id)
+
+
+@app.get("/batch/{job_id}")
+async def get_batch_job(job_id: str):
+    job = await asyncio.to_thread(jobs.get_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/batch/{job_id}/results")
+async def get_batch_results(job_id: str):
+    store = jobs.get_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {**job, "results": await asyncio.to_thread(store.results, job_id)}
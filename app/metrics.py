@@ -0,0 +1,200 @@
+"""
+Minimal Prometheus metrics (counters, gauges, histograms with labels) and
+per-request stage timings. Rendered in the text exposition format at
+GET /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+# Seconds, from a cache hit to a slow gpt-4o call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list["Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """In-flight count of the block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            # Non-cumulative here, summed up when rendered
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labels, key, f'le="{_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {_number(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+HTTP_REQUESTS = Counter("resume_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+HTTP_SECONDS = Histogram("resume_http_request_seconds", "HTTP request time until the response starts", ("route",))
+HTTP_IN_FLIGHT = Gauge("resume_http_requests_in_flight", "HTTP requests being handled")
+STAGE_SECONDS = Histogram(
+    "resume_stage_seconds", "Time per pipeline stage: upload, extraction, token_count, ...", ("stage", "file_type", "pages")
+)
+SECTION_SECONDS = Histogram("resume_section_seconds", "Time per section extractor, cache hits included", ("section", "outcome"))
+SECTIONS_IN_FLIGHT = Gauge("resume_sections_in_flight", "Section extractors running", ("section",))
+LLM_SECONDS = Histogram("resume_llm_call_seconds", "Time per LLM call, retries included", ("section", "model"))
+LLM_IN_FLIGHT = Gauge("resume_llm_calls_in_flight", "LLM calls running", ("section",))
+LLM_ESCALATIONS = Counter(
+    "resume_llm_escalations_total", "Small model answers asked again from the large model", ("section", "reason")
+)
+QUEUE_DEPTH = Gauge("resume_queue_depth", "LLM calls or extractions waiting for a slot", ("queue", "priority"))
+QUEUE_SECONDS = Histogram("resume_queue_wait_seconds", "Time LLM calls or extractions waited for a slot", ("queue", "priority"))
+QUEUE_REJECTED = Counter(
+    "resume_admission_rejected_total", "Requests turned away because their priority was saturated", ("priority", "status")
+)
+PARSE_SECONDS = Histogram("resume_output_parse_seconds", "Time parsing the JSON output of an LLM call", ("section",))
+
+
+def page_bucket(pages: Optional[int]) -> str:
+    """Page count label with few distinct values."""
+    if not pages:
+        return ""
+    for bound in (1, 2, 5, 10, 20, 50):
+        if pages <= bound:
+            return str(bound) if bound == 1 else f"<={bound}"
+    return ">50"
+
+
+class Timings:
+    """Seconds spent per stage in one request, for meta.timings."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.sections: dict[str, dict[str, float]] = {}
+
+    def add(self, stage: str, seconds: float, section: Optional[str] = None) -> None:
+        stages = self.sections.setdefault(section, {}) if section else self.stages
+        stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+
+    def summary(self) -> dict:
+        return {**self.stages, "sections": self.sections}
+
+
+_current_timings: ContextVar[Optional[Timings]] = ContextVar("current_timings", default=None)
+
+
+def start_timings(timings: Optional[Timings] = None) -> Timings:
+    """Start (or resume, in a streaming body) the timings of the current request."""
+    timings = timings or Timings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[Timings]:
+    return _current_timings.get()
+
+
+def record(stage: str, seconds: float, section: Optional[str] = None) -> None:
+    """Add to the current request's timings, if any."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds, section)
+
+
+@contextmanager
+def timed(stage: str, **labels) -> Iterator[None]:
+    """Time a block into the stage histogram and the current request's timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+        record(stage, seconds)
@@ -0,0 +1,126 @@
+"""
+Cleanup of the extracted text, run once per document before any prompt is
+built: headers, footers and page numbers repeated on every page, words
+hyphenated across line breaks, runs of whitespace and empty lines. Every
+section call sends the text again, so what is removed here is saved in
+each of them.
+"""
+import math
+import re
+from collections import Counter
+
+from app import config
+from app.tokens import count_tokens
+
+
+# Non-empty lines looked at for headers and footers at each end of a page
+EDGE_LINES = 3
+# Shorter documents keep every line: on two pages a line repeated at their
+# edges is as likely to be content ("Software Engineer") as a footer
+MIN_PAGES = 3
+
+# "3", "- 3 -", "Page 3", "Page 3 of 5", "3/5". Bare numbers have at most
+# 3 digits so a year on its own line is kept.
+PAGE_NUMBER = re.compile(r"^(?:page\s*)?[-\u2013(\[]?\s*\d{1,3}\s*(?:(?:/|of)\s*\d{1,3})?\s*[-\u2013)\]]?$", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+# "devel-\nopment", only between lower case letters so "Jean-\nPierre" and list dashes stay
+_HYPHEN_BREAK = re.compile(r"([a-z])[-\u00ad][ \t]*\n[ \t]*([a-z])")
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]+")
+# Zero width characters and soft hyphens
+_INVISIBLE = re.compile(r"[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def settings_key() -> str:
+    """Tells apart cached documents extracted with other normalization settings."""
+    if not config.NORMALIZE_TEXT:
+        return "raw"
+    flags = (config.NORMALIZE_REPEATED_LINES, config.NORMALIZE_DEHYPHENATE, config.NORMALIZE_TABLES)
+    # v2: repeated lines matched per edge, documents under MIN_PAGES kept as is
+    return "normalized-v2:" + "".join("1" if flag else "0" for flag in flags)
+
+
+def _line_key(line: str) -> str:
+    # "Jane Doe - Page 2" and "Jane Doe - Page 3" are the same footer
+    return _DIGITS.sub("#", " ".join(line.split()).lower())
+
+
+def _edges(lines: list[str]) -> dict[int, set[str]]:
+    """Index -> "top" and/or "bottom" of the lines at the ends of a page."""
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = {}
+    for i in content[:EDGE_LINES]:
+        edges.setdefault(i, set()).add("top")
+    for i in content[-EDGE_LINES:]:
+        edges.setdefault(i, set()).add("bottom")
+    return edges
+
+
+def repeated_lines(pages: list[list[str]]) -> set[tuple[str, str]]:
+    """
+    (edge, key) of the lines found at the same end, top or bottom, of at
+    least half the pages and of MIN_PAGES at least.
+    """
+    if len(pages) < MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        counts.update({(edge, _line_key(lines[i])) for i, edges in _edges(lines).items() for edge in edges})
+    threshold = max(MIN_PAGES, math.ceil(len(pages) / 2))
+    return {
+        (edge, key) for (edge, key), count in counts.items()
+        if count >= threshold and any(c.isalpha() for c in key)
+    }
+
+
+def clean_text(text: str, stats: dict) -> str:
+    """Join hyphenated words, collapse whitespace and drop runs of empty lines."""
+    if config.NORMALIZE_DEHYPHENATE:
+        text, joined = _HYPHEN_BREAK.subn(r"\1\2", text)
+        stats["hyphenations_joined"] += joined
+    text = _INVISIBLE.sub("", text)
+    text = "\n".join(_SPACES.sub(" ", line).strip() for line in text.splitlines())
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def normalize_pages(pages: list[str]) -> tuple[str, dict]:
+    """
+    The cleaned text of a document's pages (one item for a DOCX) and what
+    was removed. A line repeated as a header or footer is kept where it
+    first appears, so a name repeated at the top of every page is still
+    there once. Documents of fewer than MIN_PAGES pages keep all their lines.
+    """
+    stats = {"repeated_lines_removed": 0, "page_numbers_removed": 0, "hyphenations_joined": 0}
+    split = [page.splitlines() for page in pages]
+    strip_edges = config.NORMALIZE_REPEATED_LINES and len(pages) >= MIN_PAGES
+    repeated = repeated_lines(split) if strip_edges else set()
+    seen = set()
+    cleaned = []
+    for lines in split:
+        edges = _edges(lines) if strip_edges else {}
+        kept = []
+        for i, line in enumerate(lines):
+            if i in edges:
+                if PAGE_NUMBER.match(line.strip()):
+                    stats["page_numbers_removed"] += 1
+                    continue
+                key = _line_key(line)
+                if any((edge, key) in repeated for edge in edges[i]):
+                    if key in seen:
+                        stats["repeated_lines_removed"] += 1
+                        continue
+                    seen.add(key)
+            kept.append(line)
+        cleaned.append("\n".join(kept))
+    raw = "".join(pages)
+    text = clean_text("\n".join(cleaned), stats)
+
+    tokens_before, tokens_after = count_tokens(raw), count_tokens(text)
+    return text, {
+        "chars_before": len(raw),
+        "chars_after": len(text),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        **stats,
+    }
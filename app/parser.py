@@ -1,23 +1,176 @@
+import io
+import time
 import fitz  # PyMuPDF
 import docx
-from typing import Union
+from typing import BinaryIO, Optional, Union
 from pathlib import Path
 
-def extract_text(file_path: Union[str, Path], file_type: str) -> str:
+# A file path, the file bytes or a binary file object
+Source = Union[str, Path, bytes, BinaryIO]
+
+def extract_text(
+    source: Source, file_type: str, max_pages: Optional[int] = None, max_chars: Optional[int] = None
+) -> str:
     if file_type == "pdf":
-        return extract_text_from_pdf(file_path)
+        return extract_text_from_pdf(source, max_pages=max_pages, max_chars=max_chars)
     elif file_type == "docx":
-        return extract_text_from_docx(file_path)
+        return extract_text_from_docx(source)
     else:
         raise ValueError("Unsupported file type")
 
-def extract_text_from_pdf(file_path: Union[str, Path]) -> str:
-    text = ""
-    with fitz.open(file_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+def open_pdf(source: Source) -> fitz.Document:
+    if isinstance(source, (str, Path)):
+        return fitz.open(source)
+    if not isinstance(source, (bytes, bytearray)):
+        source = source.read()
+    return fitz.open(stream=source, filetype="pdf")
+
+def pdf_page_count(source: Source) -> int:
+    with open_pdf(source) as doc:
+        return doc.page_count
+
+def inspect_pdf(source: Source) -> dict:
+    """
+    Page count and password protection of a PDF, read from its trailer and
+    page tree without extracting any text. A file PyMuPDF cannot open comes
+    back with an error instead of raising, so it crosses the process pool.
+    """
+    try:
+        with open_pdf(source) as doc:
+            return {"pages": doc.page_count, "encrypted": bool(doc.needs_pass), "error": None}
+    except Exception as e:
+        return {"pages": 0, "encrypted": False, "error": str(e) or e.__class__.__name__}
+
+def pdf_heading_lines(page: fitz.Page, textpage: Optional[fitz.TextPage] = None) -> list[str]:
+    """Short lines of a page set in bold or in a larger font than the body text."""
+    lines = []
+    for block in page.get_text("dict", textpage=textpage)["blocks"]:
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if spans:
+                lines.append(spans)
+    if not lines:
+        return []
+    sizes = sorted(span["size"] for spans in lines for span in spans)
+    body_size = sizes[len(sizes) // 2]
+
+    headings = []
+    for spans in lines:
+        text = "".join(span["text"] for span in spans).strip()
+        bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+        large = max(span["size"] for span in spans) >= body_size * 1.15
+        if len(text) <= 50 and (bold or large):
+            headings.append(text)
+    return headings
+
+def extract_pdf_pages(
+    source: Source,
+    start: int = 0,
+    stop: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    headings: bool = False,
+    links: bool = False,
+) -> list[tuple[str, float, list[str], list[str]]]:
+    """
+    Text, extraction time in seconds and, if asked for, heading lines and
+    link targets of pages start..stop-1. Stops early once max_chars
+    characters have been extracted.
+    """
+    pages = []
+    char_count = 0
+    with open_pdf(source) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_number in range(start, stop):
+            page_start = time.perf_counter()
+            page = doc[page_number]
+            # One text page for both, the layout analysis is most of the cost
+            textpage = page.get_textpage() if headings else None
+            text = page.get_text(textpage=textpage)
+            page_headings = pdf_heading_lines(page, textpage) if headings else []
+            page_links = [link["uri"] for link in page.get_links() if link.get("uri")] if links else []
+            pages.append((text, time.perf_counter() - page_start, page_headings, page_links))
+            char_count += len(text)
+            if max_chars and char_count >= max_chars:
+                break
+    return pages
+
+def extract_text_from_pdf(
+    source: Source, max_pages: Optional[int] = None, max_chars: Optional[int] = None
+) -> str:
+    text = "".join(page_text for page_text, *_ in extract_pdf_pages(source, 0, max_pages, max_chars))
+    return text[:max_chars] if max_chars else text
+
+def open_docx(source: Source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return docx.Document(source)
+
+def docx_heading_lines(doc) -> list[str]:
+    """Paragraphs with a heading/title style or with only bold runs."""
+    # para.style looks the style up in styles.xml on every access, so map
+    # style ids to names once and read the id from the paragraph XML
+    style_names = {style.style_id: style.name.lower() for style in doc.styles if style.name}
+    headings = []
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if not text or len(text) > 50:
+            continue
+        style = style_names.get(para._p.style, "")
+        runs = [run for run in para.runs if run.text.strip()]
+        if style.startswith(("heading", "title")) or (runs and all(run.bold for run in runs)):
+            headings.append(text)
+    return headings
+
+def docx_links(doc) -> list[str]:
+    """Targets of the external hyperlinks in the document body."""
+    return [rel.target_ref for rel in doc.part.rels.values() if rel.reltype.endswith("/hyperlink") and rel.is_external]
+
+def docx_table_lines(table) -> list[str]:
+    """
+    A table as text lines. A row of one-line cells becomes one line with
+    the cells separated by " | ". Rows with longer cells, like a two column
+    layout table, keep the lines of each cell so headings stay on their own line.
+    """
+    lines = []
+    for row in table.rows:
+        cells, seen = [], set()
+        for cell in row.cells:
+            # Merged cells come back once per grid column
+            if id(cell._tc) in seen:
+                continue
+            seen.add(id(cell._tc))
+            cell_lines = [para.text.strip() for para in cell.paragraphs if para.text.strip()]
+            for nested in cell.tables:
+                cell_lines.extend(docx_table_lines(nested))
+            if cell_lines:
+                cells.append(cell_lines)
+        if not cells:
+            continue
+        if all(len(cell_lines) == 1 for cell_lines in cells):
+            lines.append(" | ".join(cell_lines[0] for cell_lines in cells))
+        else:
+            lines.extend(line for cell_lines in cells for line in cell_lines)
+    return lines
+
+def extract_docx(
+    source: Source, headings: bool = False, links: bool = False, tables: bool = False
+) -> tuple[str, list[str], list[str]]:
+    """
+    Text and, if asked for, heading lines and link targets of a DOCX file.
+    With tables the text of tables is kept too, in document order.
+    """
+    doc = open_docx(source)
+    if tables:
+        lines = []
+        for block in doc.iter_inner_content():
+            if isinstance(block, docx.table.Table):
+                lines.extend(docx_table_lines(block))
+            else:
+                lines.append(block.text)
+        text = "\n".join(lines)
+    else:
+        text = "\n".join([para.text for para in doc.paragraphs])
+    return text, docx_heading_lines(doc) if headings else [], docx_links(doc) if links else []
 
-def extract_text_from_docx(file_path: Union[str, Path]) -> str:
-    doc = docx.Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs])
+def extract_text_from_docx(source: Source) -> str:
+    return extract_docx(source)[0]
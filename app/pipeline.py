@@ -0,0 +1,171 @@
+import time
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from datetime import datetime
+from typing import Optional
+
+from app import config
+from app.cache import MISS, document_key, get_cache, get_single_flight
+from app.contacts import find_contacts, resolved_fields
+from app.metrics import STAGE_SECONDS, current_timings, page_bucket, record, timed
+from app.normalize import settings_key
+from app.runner import empty_result
+from app.segmenter import segment
+from app.tokens import count_tokens_async, current_usage, estimate_cost
+from app.workers import extract_document_async
+
+
+# Response key of a section when it differs from the section name
+RESPONSE_KEYS = {"languages": "extract_languages"}
+
+
+@dataclass
+class Document:
+    text: str
+    # Heading lines found from the layout (bold/large fonts, heading styles)
+    headings: list[str] = field(default_factory=list)
+    # Link targets (URLs, mailto:) of the PDF/DOCX
+    links: list[str] = field(default_factory=list)
+    extraction: dict = field(default_factory=dict)
+    # Characters and tokens removed by app/normalize.py
+    normalization: dict = field(default_factory=dict)
+
+    @cached_property
+    def contacts(self) -> dict:
+        """Contact fields found without the LLM (see app/contacts.py)."""
+        return find_contacts(self.text, self.links) if config.CONTACT_FAST_PATH else {}
+
+
+async def load_document(data: bytes, file_type: str) -> Document:
+    """The extracted document, from the cache or extracted in the worker pool."""
+    cache = get_cache()
+    key = document_key(data, file_type, settings_key())
+    cached = await cache.get_async(key)
+    if cached is not MISS:
+        return Document(
+            cached["text"], cached["headings"], cached["links"], {"cached": True}, cached.get("normalization", {})
+        )
+    start = time.perf_counter()
+    if config.COALESCE_REQUESTS:
+        # The same upload arriving twice at once is extracted once
+        extracted = await get_single_flight().do(key, lambda: extract_document_async(data, file_type))
+    else:
+        extracted = await extract_document_async(data, file_type)
+    seconds = time.perf_counter() - start
+    pages = page_bucket(extracted["extraction"].get("pages"))
+    STAGE_SECONDS.observe(seconds, stage="extraction", file_type=file_type, pages=pages)
+    record("extraction", seconds)
+    await cache.set_async(key, {key: extracted[key] for key in ("text", "headings", "links", "normalization")})
+    return Document(
+        extracted["text"], extracted["headings"], extracted["links"], extracted["extraction"], extracted["normalization"]
+    )
+
+
+def _with_text(extractor, text: str):
+    async def run(resume_text: str):
+        return await extractor(text)
+
+    return run
+
+
+def _skipped(section: str):
+    async def run(resume_text: str):
+        return empty_result(section)
+
+    return run
+
+
+def route_sections(document: Document, extractors: dict) -> tuple[dict, dict]:
+    """
+    Give each extractor only the resume blocks it needs (see app/segmenter.py)
+    and skip optional sections that are very likely absent. personal_info
+    gets the contact fields already found so the LLM is not asked for them.
+    Returns the routed extractors and extra meta.
+    """
+    with timed("routing"):
+        return _route_sections(document, extractors)
+
+
+def _route_sections(document: Document, extractors: dict) -> tuple[dict, dict]:
+    extra = {}
+    if "personal_info" in extractors and document.contacts:
+        extractors = {**extractors, "personal_info": partial(extractors["personal_info"], contacts=document.contacts)}
+        extra["fast_path_fields"] = sorted(resolved_fields(document.contacts))
+    if not config.SEGMENT_SECTIONS and not config.SKIP_MIN_CONFIDENCE:
+        return extractors, extra
+    segmentation = segment(document.text, document.headings)
+    routed, section_chars, confidence, skipped = {}, {}, {}, []
+    for name, extractor in extractors.items():
+        confidence[name] = segmentation.confidence(name)
+        if confidence[name] < config.SKIP_MIN_CONFIDENCE:
+            routed[name] = _skipped(name)
+            skipped.append(name)
+        elif config.SEGMENT_SECTIONS:
+            text = segmentation.text_for(name)
+            routed[name] = _with_text(extractor, text)
+            section_chars[name] = len(text)
+        else:
+            routed[name] = extractor
+    return routed, {
+        **extra,
+        "segmentation": {"headings": segmentation.kinds, "section_chars": section_chars, "confidence": confidence},
+        "skipped_sections": skipped,
+    }
+
+
+def routed_texts(document: Document, sections) -> dict[str, Optional[str]]:
+    """The text route_sections() sends each section, None for the ones it skips."""
+    if not config.SEGMENT_SECTIONS and not config.SKIP_MIN_CONFIDENCE:
+        return {name: document.text for name in sections}
+    segmentation = segment(document.text, document.headings)
+    texts = {}
+    for name in sections:
+        if segmentation.confidence(name) < config.SKIP_MIN_CONFIDENCE:
+            texts[name] = None
+        else:
+            texts[name] = segmentation.text_for(name) if config.SEGMENT_SECTIONS else document.text
+    return texts
+
+
+async def build_meta(document: Document, start_time: float, errors: dict, **extra) -> dict:
+    raw_text = document.text
+    char_count = len(raw_text)
+    ledger = current_usage()
+    # Reuses the count of the sections sent the full text
+    if ledger is not None:
+        token_count = await ledger.text_tokens(raw_text, "gpt-4o")
+    else:
+        token_count = await count_tokens_async(raw_text, "gpt-4o")
+    usage = ledger.summary() if ledger else {}
+    models = ledger.models() if ledger else {}
+    # Sections served from the cache cost nothing
+    cost_estimate = usage.get("cost_usd", estimate_cost(token_count))
+    processing_time = round(time.time() - start_time, 2)  # in seconds
+    timestamp = datetime.utcnow().isoformat() + "Z"  # current UTC time
+    timings = current_timings()
+    if config.META_TIMINGS and timings is not None:
+        extra = {**extra, "timings": {**timings.summary(), "total": processing_time}}
+
+    return {
+        "char_count": char_count,
+        "token_count": token_count,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "estimated_cost_usd": cost_estimate,
+        "usage": usage,
+        "processing_time_seconds": processing_time,
+        # Every model that answered, and the one per section (not for cache hits)
+        "model_used": ", ".join(sorted(set(models.values()))) or config.LLM_MODEL,
+        "models_used": models,
+        "timestamp": timestamp,
+        "section_errors": errors,
+        "extraction": document.extraction,
+        "normalization": document.normalization,
+        **extra
+    }
+
+
+async def build_response(document: Document, sections: dict, errors: dict, start_time: float, **extra) -> dict:
+    response = {RESPONSE_KEYS.get(name, name): result for name, result in sections.items()}
+    response["raw_text_preview"] = document.text[:1000]
+    response["meta"] = await build_meta(document, start_time, errors, **extra)
+    return response
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app import config
+from app.metrics import SECTION_SECONDS, SECTIONS_IN_FLIGHT, record
+
+
+logger = logging.getLogger(__name__)
+
+Extractor = Callable[[str], Awaitable]
+
+
+def empty_result(section: str):
+    # personal_info is an object, every other section is a list
+    return None if section == "personal_info" else []
+
+
+async def iter_sections(
+    raw_text: str,
+    extractors: dict[str, Extractor],
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[tuple[str, object, Optional[str]]]:
+    """
+    Run the section extractors concurrently on the same resume text and
+    yield (section, result, error) as each one finishes.
+
+    A section that fails or times out yields an empty result and a short
+    error message, so the other sections are still returned.
+    """
+    max_concurrency = max_concurrency or config.MAX_SECTION_CONCURRENCY
+    timeout = config.SECTION_TIMEOUT_SECONDS if timeout is None else timeout
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(section: str, extractor: Extractor):
+        result, error, outcome = empty_result(section), None, "ok"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                with SECTIONS_IN_FLIGHT.track(section=section):
+                    if timeout:
+                        result = await asyncio.wait_for(extractor(raw_text), timeout)
+                    else:
+                        result = await extractor(raw_text)
+            except asyncio.TimeoutError:
+                error, outcome = f"timed out after {timeout}s", "timeout"
+            except Exception as e:
+                error, outcome = str(e) or e.__class__.__name__, "error"
+            seconds = time.perf_counter() - start
+        SECTION_SECONDS.observe(seconds, section=section, outcome=outcome)
+        record("total", seconds, section)
+        if error:
+            logger.warning("Section %s failed: %s", section, error)
+        return section, result, error
+
+    tasks = [asyncio.ensure_future(run_one(section, extractor)) for section, extractor in extractors.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer went away (e.g. the client disconnected)
+        for task in tasks:
+            task.cancel()
+
+
+async def run_sections(
+    raw_text: str,
+    extractors: dict[str, Extractor],
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> tuple[dict, dict]:
+    """Run the section extractors concurrently and return (results, errors)."""
+    results, errors = {}, {}
+    async for section, result, error in iter_sections(raw_text, extractors, max_concurrency, timeout):
+        results[section] = result
+        if error:
+            errors[section] = error
+    # Keep the order of extractors
+    return {section: results[section] for section in extractors}, errors
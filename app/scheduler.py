@@ -0,0 +1,150 @@
+"""
+Priority scheduling of the work shared by all requests: LLM calls and text
+extraction. Each request is tagged with the priority of its endpoint (first,
+second, third, or batch for batch jobs), its work waits for a slot in a
+queue per priority, and a new request of a saturated priority is turned
+away before any work is done for it.
+"""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from app import config
+from app.metrics import QUEUE_DEPTH, QUEUE_SECONDS
+
+
+class Overloaded(Exception):
+    """A request turned away by admission control, with the HTTP status and Retry-After seconds."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+_current_priority: ContextVar[str] = ContextVar("current_priority", default="first")
+
+
+def start_priority(priority: str) -> None:
+    """Queue the work of the current request, and of the tasks it starts, at this priority."""
+    _current_priority.set(priority)
+
+
+def current_priority() -> str:
+    # With admission control off everything is one FIFO queue
+    return _current_priority.get() if config.ADMISSION_CONTROL else "first"
+
+
+class WeightedSlots:
+    """
+    At most limit tasks at once, the others queued per priority. A freed
+    slot goes to the waiting priority with the lowest pass (stride
+    scheduling): each task started adds 1 / weight to its priority's pass,
+    so while several priorities wait they get slots in proportion to their
+    weights, and a priority that was idle does not save up credit. Tasks of
+    one priority start in arrival order.
+    """
+
+    def __init__(self, limit: float, weights: Optional[dict[str, float]] = None, name: str = ""):
+        self.limit = float(limit)
+        self.weights = weights or {}
+        self.name = name
+        self.in_flight = 0
+        self.running: dict[str, int] = {}
+        # Moving average of the task seconds, for the estimated waits
+        self.mean_latency: Optional[float] = None
+        # priority -> (future, enqueue time) of the waiting tasks
+        self._waiters: dict[str, deque[tuple[asyncio.Future, float]]] = {}
+        self._pass: dict[str, float] = {}
+        self._virtual_time = 0.0
+
+    def weight(self, priority: str) -> float:
+        return max(self.weights.get(priority, 1.0), 0.001)
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        """Tasks waiting for a slot, of one priority or of all."""
+        if priority is not None:
+            return len(self._waiters.get(priority, ()))
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def oldest_wait(self, priority: str) -> float:
+        """Seconds the longest waiting task of the priority has waited."""
+        waiters = self._waiters.get(priority)
+        return time.monotonic() - waiters[0][1] if waiters else 0.0
+
+    def estimated_wait(self, priority: str) -> float:
+        """Seconds a new task of the priority would wait, from its queue, its share of the slots and the latency."""
+        waiting = [p for p, waiters in self._waiters.items() if waiters or p == priority]
+        share = self.weight(priority) / sum(self.weight(p) for p in waiting)
+        return (self.queued(priority) + 1) * (self.mean_latency or 1.0) / (max(self.limit, 1.0) * share)
+
+    async def acquire(self, priority: str = "first") -> float:
+        """Take a slot, waiting for it if needed. Returns the seconds waited."""
+        if self.in_flight < int(self.limit) and not self.queued():
+            self._start(priority)
+            waited = 0.0
+        else:
+            waited = await self._wait(priority)
+        QUEUE_SECONDS.observe(waited, queue=self.name, priority=priority)
+        return waited
+
+    async def _wait(self, priority: str) -> float:
+        waiters = self._waiters.setdefault(priority, deque())
+        if not waiters:
+            # Back from idle: no credit for the time nothing was queued
+            self._pass[priority] = max(self._pass.get(priority, 0.0), self._virtual_time)
+        entry = (asyncio.get_running_loop().create_future(), time.monotonic())
+        waiters.append(entry)
+        QUEUE_DEPTH.inc(queue=self.name, priority=priority)
+        try:
+            # Set to the seconds waited by _wake(), which also took the slot for us
+            return await entry[0]
+        except asyncio.CancelledError:
+            if entry in waiters:
+                waiters.remove(entry)
+                QUEUE_DEPTH.dec(queue=self.name, priority=priority)
+            elif not entry[0].cancelled():
+                # Given a slot but not taking it, pass it on
+                self.release(priority)
+            raise
+
+    def _start(self, priority: str) -> None:
+        self.in_flight += 1
+        self.running[priority] = self.running.get(priority, 0) + 1
+
+    def release(self, priority: str = "first", latency: Optional[float] = None) -> None:
+        """latency is None for tasks that failed or were cancelled."""
+        self.in_flight -= 1
+        self.running[priority] -= 1
+        if latency is not None:
+            self.mean_latency = latency if self.mean_latency is None else 0.9 * self.mean_latency + 0.1 * latency
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.in_flight < int(self.limit):
+            waiting = [priority for priority, waiters in self._waiters.items() if waiters]
+            if not waiting:
+                return
+            priority = min(waiting, key=lambda p: (self._pass[p], -self.weight(p)))
+            future, queued_at = self._waiters[priority].popleft()
+            QUEUE_DEPTH.dec(queue=self.name, priority=priority)
+            if future.done():
+                continue
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1 / self.weight(priority)
+            self._start(priority)
+            future.set_result(time.monotonic() - queued_at)
+
+    def stats(self) -> dict:
+        priorities = sorted(set(self._waiters) | set(self.running))
+        return {
+            priority: {
+                "weight": self.weight(priority),
+                "queued": self.queued(priority),
+                "running": self.running.get(priority, 0),
+                "oldest_wait_seconds": round(self.oldest_wait(priority), 3),
+            }
+            for priority in priorities
+        }
@@ -0,0 +1,133 @@
+import re
+from typing import Iterable, Optional
+
+
+# Block kind -> heading phrases, compared lowercased without punctuation
+HEADINGS = {
+    "contact": ["contact", "contact details", "contact information", "personal details", "personal information", "personal info"],
+    "summary": ["summary", "profile", "about", "about me", "objective", "career objective", "professional summary", "profile summary"],
+    "experience": [
+        "experience", "work experience", "professional experience", "employment", "employment history",
+        "work history", "career history", "relevant experience", "internships", "internship",
+    ],
+    "education": ["education", "academic background", "academic qualifications", "qualifications", "education and training"],
+    "skills": ["skills", "technical skills", "key skills", "core competencies", "competencies", "technologies", "tools"],
+    "projects": ["projects", "personal projects", "academic projects", "key projects", "project experience"],
+    "certifications": ["certifications", "certification", "certificates", "licenses", "licenses and certifications"],
+    "awards": ["awards", "honors", "honours", "achievements", "awards and honors", "awards and achievements"],
+    "languages": ["languages", "language skills", "languages known"],
+    "memberships": ["memberships", "membership", "affiliations", "professional memberships", "associations", "professional affiliations"],
+    "training": ["training", "trainings", "workshops", "training and development", "professional development"],
+    "skilling": ["courses", "online courses", "coursework", "skill development", "upskilling"],
+    "conferences": ["conferences", "conference", "presentations", "talks", "seminars", "conferences attended"],
+    "other": ["interests", "hobbies", "references", "publications", "volunteering", "volunteer experience", "declaration"],
+}
+
+# Blocks each section extractor needs. "header" is the text before the first heading.
+SECTION_BLOCKS = {
+    "personal_info": ["header", "contact", "summary"],
+    "skills": ["skills", "summary", "experience", "projects"],
+    "education": ["education"],
+    "employment": ["experience"],
+    "projects": ["projects", "experience"],
+    "certifications": ["certifications", "training", "skilling"],
+    "awards": ["awards"],
+    "languages": ["languages", "skills"],
+    "memberships": ["memberships"],
+    "training": ["training", "certifications", "skilling"],
+    "skilling": ["skilling", "training", "certifications"],
+    "conferences": ["conferences"],
+}
+
+# Words that hint an optional section is in the resume, matched as word prefixes.
+# Sections without keywords (personal info, skills, education, employment) are never skipped.
+SECTION_KEYWORDS = {
+    "projects": ["project"],
+    "certifications": ["certif", "certified", "license", "licence", "credential"],
+    "awards": ["award", "honor", "honour", "prize", "winner", "medal", "scholarship", "recognition", "achievement"],
+    "languages": ["language", "fluent", "native", "bilingual", "mother tongue"],
+    "memberships": ["member", "association", "society", "affiliat", "chapter", "ieee", "acm"],
+    "training": ["training", "trained", "workshop", "bootcamp"],
+    "skilling": ["course", "coursera", "udemy", "edx", "mooc", "nanodegree", "upskill"],
+    "conferences": ["conference", "summit", "symposium", "seminar", "webinar", "meetup", "speaker", "presented", "talk"],
+}
+
+_KEYWORD_PATTERNS = {
+    section: re.compile(r"\b(" + "|".join(re.escape(word) for word in words) + ")", re.IGNORECASE)
+    for section, words in SECTION_KEYWORDS.items()
+}
+
+_HEADING_LOOKUP = {phrase: kind for kind, phrases in HEADINGS.items() for phrase in phrases}
+_NON_WORD = re.compile(r"[^a-z& ]+")
+
+
+def _heading_key(line: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", line.lower()).replace("&", " and ").split())
+
+
+def heading_kind(line: str, layout_headings: frozenset = frozenset()) -> Optional[str]:
+    """The block kind a line starts, or None when it is not a heading."""
+    text = line.strip()
+    if not text or len(text) > 50:
+        return None
+    key = _heading_key(text)
+    kind = _HEADING_LOOKUP.get(key)
+    if kind:
+        return kind
+    # "WORK EXPERIENCE & INTERNSHIPS", or a bold/large line like "Education Details"
+    if text in layout_headings or (text.isupper() and len(key.split()) <= 5):
+        for phrase, kind in _HEADING_LOOKUP.items():
+            if key.startswith(phrase + " ") or key.endswith(" " + phrase):
+                return kind
+    return None
+
+
+class Segmentation:
+    """The resume text split into blocks, each starting at a heading."""
+
+    def __init__(self, text: str, blocks: list[tuple[str, str]]):
+        self.text = text
+        # (kind, text) in document order
+        self.blocks = blocks
+
+    @property
+    def kinds(self) -> list[str]:
+        return [kind for kind, _ in self.blocks if kind != "header"]
+
+    def text_for(self, section: str) -> str:
+        """The blocks a section needs, or the full text when none of them was found."""
+        wanted = SECTION_BLOCKS.get(section)
+        if not wanted or not self.kinds:
+            return self.text
+        parts = [block for kind, block in self.blocks if kind in wanted]
+        if not any(part.strip() for part in parts):
+            return self.text
+        return "\n".join(parts)
+
+    def confidence(self, section: str) -> float:
+        """
+        How sure we are that a section is in the resume: 1.0 with its own
+        heading, otherwise 0.5 per distinct keyword found, up to 1.0.
+        """
+        pattern = _KEYWORD_PATTERNS.get(section)
+        if pattern is None or section in self.kinds:
+            return 1.0
+        keywords = {match.lower() for match in pattern.findall(self.text)}
+        return min(1.0, 0.5 * len(keywords))
+
+
+def segment(text: str, layout_headings: Iterable[str] = ()) -> Segmentation:
+    """Split resume text on heading lines, using heading lines found from the layout as hints."""
+    layout_headings = frozenset(line.strip() for line in layout_headings)
+    blocks = []
+    kind, lines = "header", []
+    for line in text.splitlines():
+        line_kind = heading_kind(line, layout_headings)
+        if line_kind:
+            if lines:
+                blocks.append((kind, "\n".join(lines)))
+            kind, lines = line_kind, []
+        lines.append(line)
+    if lines:
+        blocks.append((kind, "\n".join(lines)))
+    return Segmentation(text, blocks)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from app.metrics import timed
+
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens: (input, output)
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = "gpt-4o") -> Optional[tiktoken.Encoding]:
+    """The tiktoken encoder of a model, loaded once per process."""
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use
+        logger.warning("Could not load the tiktoken encoder for %s, approximating token counts: %s", model_name, e)
+        return None
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o") -> int:
+    with timed("token_count"):
+        enc = get_encoder(model_name)
+        if enc is None:
+            return (len(text) + 3) // 4
+        return len(enc.encode(text, disallowed_special=()))
+
+
+async def count_tokens_async(text: str, model_name: str = "gpt-4o") -> int:
+    # Encoding a whole resume takes milliseconds, not for the event loop
+    return await asyncio.to_thread(count_tokens, text, model_name)
+
+
+def _prices(model_name: str) -> tuple[float, float]:
+    # The API reports dated names like gpt-4o-mini-2024-07-18
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model_name.startswith(name):
+            return PRICES[name]
+    return PRICES["gpt-4o"]
+
+
+def estimate_cost(input_tokens: int, output_tokens: int = 0, model_name: str = "gpt-4o") -> float:
+    input_price, output_price = _prices(model_name)
+    return round(input_tokens / 1_000_000 * input_price + output_tokens / 1_000_000 * output_price, 6)
+
+
+class UsageLedger:
+    """
+    Token usage of one request, per section. Prompt tokens are counted
+    locally before each call, input/output tokens are taken from the usage
+    the API reports. A section escalated from the small model to the large
+    one is priced per model.
+    """
+
+    def __init__(self, model_name: str = "gpt-4o"):
+        self.model_name = model_name
+        self.sections: dict[str, dict] = {}
+        # section -> model -> the same counts, for the cost
+        self._models: dict[str, dict[str, dict]] = {}
+        self._text_tokens: dict[tuple[int, str], int] = {}
+
+    def _section(self, section: str) -> dict:
+        return self.sections.setdefault(section, {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "model": self.model_name,
+        })
+
+    async def text_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        # Every section sends the same resume text and meta counts it again,
+        # count it once per request
+        key = (hash(text), model_name or self.model_name)
+        if key not in self._text_tokens:
+            self._text_tokens[key] = await count_tokens_async(text, key[1])
+        return self._text_tokens[key]
+
+    def _model(self, section: str, model_name: str) -> dict:
+        return self._models.setdefault(section, {}).setdefault(
+            model_name, {"prompt_tokens": 0, "input_tokens": 0, "output_tokens": 0}
+        )
+
+    def add_prompt(self, section: str, prompt_tokens: int, model_name: Optional[str] = None) -> None:
+        usage = self._section(section)
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        if model_name:
+            usage["model"] = model_name
+        self._model(section, usage["model"])["prompt_tokens"] += prompt_tokens
+
+    def add_usage(self, section: str, input_tokens: int, output_tokens: int, model_name: Optional[str] = None) -> None:
+        usage = self._section(section)
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+        if model_name:
+            usage["model"] = model_name
+        by_model = self._model(section, usage["model"])
+        by_model["input_tokens"] += input_tokens
+        by_model["output_tokens"] += output_tokens
+
+    def escalate(self, section: str, model_name: str, reason: str) -> None:
+        """Record that the answer of model_name was not used and the large model was asked."""
+        usage = self._section(section)
+        usage["escalated_from"] = model_name
+        usage["escalation_reason"] = reason
+
+    def merge(self, other: "UsageLedger", coalesced: bool = False) -> None:
+        """
+        Add the usage of another ledger, the one of a call shared with other
+        requests. coalesced marks the sections this request joined instead
+        of calling for them.
+        """
+        for section, usage in other.sections.items():
+            mine = self._section(section)
+            for key in ("calls", "prompt_tokens", "input_tokens", "output_tokens"):
+                mine[key] += usage[key]
+            mine["model"] = usage["model"]
+            for key in ("escalated_from", "escalation_reason"):
+                if key in usage:
+                    mine[key] = usage[key]
+            if coalesced:
+                mine["coalesced"] = True
+        for section, models in other._models.items():
+            for model_name, counts in models.items():
+                mine = self._model(section, model_name)
+                for key, value in counts.items():
+                    mine[key] += value
+
+    def callback(self, section: str, model_name: Optional[str] = None):
+        """Records the reported usage, under model_name if given or else the model the API reports."""
+        return usage_callback_class()(self, section, model_name)
+
+    def models(self) -> dict[str, str]:
+        """The model that answered each section called."""
+        return {section: usage["model"] for section, usage in self.sections.items()}
+
+    def summary(self) -> dict:
+        sections = {}
+        for section, usage in self.sections.items():
+            sections[section] = {
+                **usage,
+                # Fall back to the local prompt count when the API reported no usage
+                "cost_usd": round(sum(
+                    estimate_cost(counts["input_tokens"] or counts["prompt_tokens"], counts["output_tokens"], model_name)
+                    for model_name, counts in self._models.get(section, {}).items()
+                ), 6),
+            }
+        return {
+            "prompt_tokens": sum(usage["prompt_tokens"] for usage in sections.values()),
+            "input_tokens": sum(usage["input_tokens"] for usage in sections.values()),
+            "output_tokens": sum(usage["output_tokens"] for usage in sections.values()),
+            "cost_usd": round(sum(usage["cost_usd"] for usage in sections.values()), 6),
+            "sections": sections,
+        }
+
+
+@lru_cache(maxsize=None)
+def usage_callback_class() -> type:
+    # Defined on first use so importing this module does not import langchain
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCallback(BaseCallbackHandler):
+        """Records the token usage of the LLM response into a ledger."""
+
+        run_inline = True
+
+        def __init__(self, ledger: UsageLedger, section: str, model_name: Optional[str] = None):
+            self.ledger = ledger
+            self.section = section
+            self.model_name = model_name
+
+        def on_llm_end(self, response, **kwargs) -> None:
+            model_name = self.model_name or (response.llm_output or {}).get("model_name")
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        self.ledger.add_usage(self.section, usage["input_tokens"], usage["output_tokens"], model_name)
+
+    return UsageCallback
+
+
+_current_usage: ContextVar[Optional[UsageLedger]] = ContextVar("current_usage", default=None)
+
+
+def start_usage(model_name: str = "gpt-4o") -> UsageLedger:
+    """Start a ledger for the current request. Tasks started afterwards share it."""
+    ledger = UsageLedger(model_name)
+    _current_usage.set(ledger)
+    return ledger
+
+
+def current_usage() -> Optional[UsageLedger]:
+    return _current_usage.get()
@@ -0,0 +1,315 @@
+import asyncio
+import math
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app import config
+from app.ingest import UploadError
+from app.metrics import record, timed
+from app.normalize import normalize_pages
+from app.parser import extract_docx, extract_pdf_pages, inspect_pdf
+from app.scheduler import WeightedSlots, current_priority
+
+
+_pool: Optional[Executor] = None
+# One slot per worker, so a queue of low priority documents does not hold up
+# the first priority ones in the pool's own FIFO queue
+_slots: Optional[WeightedSlots] = None
+# Jobs running in each pool, and the ones nobody waits for anymore (their
+# request timed out or went away)
+_jobs: dict[Executor, set[Future]] = {}
+_abandoned: dict[Executor, set[Future]] = {}
+# Pools replaced after a timeout, killed once only abandoned jobs are left
+_retired: set[Executor] = set()
+
+
+def get_pool() -> Executor:
+    global _pool
+    if _pool is None:
+        if config.EXTRACT_POOL == "thread":
+            _pool = ThreadPoolExecutor(max_workers=config.EXTRACT_WORKERS, thread_name_prefix="extract")
+        else:
+            _pool = ProcessPoolExecutor(max_workers=config.EXTRACT_WORKERS)
+    return _pool
+
+
+async def _run(fn, *args):
+    """Run fn(*args) in the pool once a worker is free for the current request's priority."""
+    global _slots
+    if _slots is None:
+        _slots = WeightedSlots(config.EXTRACT_WORKERS, config.PRIORITY_WEIGHTS, "extraction")
+    priority = current_priority()
+    record("extraction_queue", await _slots.acquire(priority))
+    pool = get_pool()
+    try:
+        try:
+            future = _submit(pool, _slots, priority, fn, args)
+        except BrokenProcessPool:
+            # Broken by a job of another request since
+            _kill(pool)
+            pool = get_pool()
+            future = _submit(pool, _slots, priority, fn, args)
+    except BaseException:
+        _slots.release(priority)
+        raise
+    try:
+        return await _wait(pool, future)
+    except asyncio.TimeoutError:
+        _retire(pool)
+        raise
+    except BrokenProcessPool:
+        # A worker died (MuPDF crashing on a hostile file, say), which fails
+        # every job in the pool, not only the one that killed it
+        _kill(pool)
+        return await _run_alone(priority, fn, *args)
+
+
+async def _run_alone(priority: str, fn, *args):
+    """
+    Run a job again in a process of its own after the pool broke, so only the
+    document that crashes the worker fails, with a 422.
+    """
+    await _slots.acquire(priority)
+    pool = ProcessPoolExecutor(max_workers=1)
+    try:
+        try:
+            future = _submit(pool, _slots, priority, fn, args)
+        except BaseException:
+            _slots.release(priority)
+            raise
+        return await _wait(pool, future)
+    except BrokenProcessPool:
+        raise UploadError("The file crashed the text extractor.", 422)
+    finally:
+        _kill(pool)
+
+
+async def _wait(pool: Executor, future: Future):
+    # Timed from the start of the job: the time queued for a worker does not count
+    try:
+        if config.EXTRACT_TIMEOUT_SECONDS:
+            return await asyncio.wait_for(asyncio.wrap_future(future), config.EXTRACT_TIMEOUT_SECONDS)
+        return await asyncio.wrap_future(future)
+    finally:
+        if not future.done():
+            _abandoned.setdefault(pool, set()).add(future)
+            _kill_if_abandoned(pool)
+
+
+def _retire(pool: Executor) -> None:
+    """
+    Send new jobs to a new pool after one timed out in this one. Its workers
+    are killed, the stuck one with them, once the jobs other requests still
+    wait for are done, so those are neither failed nor run again.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+    _retired.add(pool)
+    _kill_if_abandoned(pool)
+
+
+def _kill_if_abandoned(pool: Executor) -> None:
+    if pool in _retired and _jobs.get(pool, set()) <= _abandoned.get(pool, set()):
+        _kill(pool)
+
+
+def _kill(pool: Executor) -> None:
+    """
+    Stop using the pool and kill its worker processes. Jobs still in it fail
+    with BrokenProcessPool. Threads cannot be killed: a stuck job in a thread
+    pool runs on, holding its slot, until it is done.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+    _retired.discard(pool)
+    _jobs.pop(pool, None)
+    _abandoned.pop(pool, None)
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+
+def _submit(pool: Executor, slots: WeightedSlots, priority: str, fn, args) -> Future:
+    """
+    Start fn(*args) in the pool. The slot is given back when the job itself
+    is done, not when its caller stops waiting: a job whose request timed out
+    or went away still keeps its worker busy.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    def done(future):
+        failed = future.cancelled() or future.exception() is not None
+        seconds = None if failed else time.perf_counter() - start
+        try:
+            loop.call_soon_threadsafe(_finished, pool, future, slots, priority, seconds)
+        except RuntimeError:
+            # The loop is closed, nothing is waiting for the slot anymore
+            pass
+
+    future = pool.submit(fn, *args)
+    _jobs.setdefault(pool, set()).add(future)
+    future.add_done_callback(done)
+    return future
+
+
+def _finished(pool: Executor, future: Future, slots: WeightedSlots, priority: str, seconds: Optional[float]) -> None:
+    _jobs.get(pool, set()).discard(future)
+    _abandoned.get(pool, set()).discard(future)
+    slots.release(priority, seconds)
+    _kill_if_abandoned(pool)
+
+
+async def _gather(*coroutines) -> list:
+    # Like asyncio.gather, but the others are cancelled as soon as one fails,
+    # so a document whose chunk timed out fails once instead of running on
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def queue_stats() -> dict:
+    """Extractions waiting and running per priority."""
+    return _slots.stats() if _slots is not None else {}
+
+
+def _ready() -> bool:
+    return True
+
+
+def warm_up() -> None:
+    """Start every worker now instead of on the first uploads."""
+    pool = get_pool()
+    for future in [pool.submit(_ready) for _ in range(config.EXTRACT_WORKERS)]:
+        future.result()
+
+
+def shutdown() -> None:
+    global _pool
+    for pool in list(_retired):
+        _kill(pool)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _page_chunks(page_count: int) -> list[tuple[int, int]]:
+    """Split pages into one range per worker, at least PDF_PAGES_PER_CHUNK pages each."""
+    chunk_count = min(config.EXTRACT_WORKERS, math.ceil(page_count / config.PDF_PAGES_PER_CHUNK))
+    chunk_size = math.ceil(page_count / max(chunk_count, 1))
+    return [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+
+
+async def _extract_pdf(data: bytes) -> dict:
+    pool = get_pool()
+    max_chars = config.EXTRACT_MAX_CHARS or None
+    headings = config.SEGMENT_LAYOUT_HINTS
+    links = config.CONTACT_FAST_PATH
+
+    # Cheap checks first, so a broken, locked or huge PDF is not extracted at all
+    info = await _run(inspect_pdf, data)
+    if info["error"]:
+        raise UploadError(f"The PDF file could not be read: {info['error']}", 400)
+    if info["encrypted"]:
+        raise UploadError("The PDF file is password protected.", 422)
+    if not info["pages"]:
+        raise UploadError("The PDF file has no pages.", 400)
+    if config.UPLOAD_MAX_PAGES and info["pages"] > config.UPLOAD_MAX_PAGES:
+        raise UploadError(f"The PDF file has more than {config.UPLOAD_MAX_PAGES} pages.", 413)
+    page_total = info["pages"]
+    page_count = min(page_total, config.EXTRACT_MAX_PAGES or page_total)
+
+    # Page ranges in parallel worker processes for long documents. PyMuPDF
+    # holds the GIL, so threads would not help.
+    if isinstance(pool, ProcessPoolExecutor) and page_count >= config.PDF_PARALLEL_MIN_PAGES:
+        chunks = _page_chunks(page_count)
+        results = await _gather(*(
+            _run(extract_pdf_pages, data, start, stop, max_chars, headings, links)
+            for start, stop in chunks
+        ))
+        pages = [page for chunk in results for page in chunk]
+    else:
+        chunks = [(0, page_count)]
+        pages = await _run(extract_pdf_pages, data, 0, page_count, max_chars, headings, links)
+
+    text, normalization = await _normalize([page_text for page_text, *_ in pages])
+    # Extraction stops once the budget is spent on raw text, and normalization
+    # shortens it again, so pages left unread are counted on their own. Parallel
+    # chunks cannot stop each other early, so the budget is applied here.
+    truncated = len(pages) < page_total or bool(max_chars and len(text) > max_chars)
+    if max_chars:
+        text = text[:max_chars]
+
+    page_seconds = [round(seconds, 4) for _, seconds, *_ in pages]
+    extraction = {
+        "pages": len(pages),
+        "pages_total": page_total,
+        "truncated": truncated,
+        "parallel_chunks": len(chunks),
+        "slowest_page": page_seconds.index(max(page_seconds)) + 1 if page_seconds else None,
+        "page_seconds": page_seconds,
+    }
+    return {
+        "text": text,
+        "headings": _heading_lines([heading for _, _, page_headings, _ in pages for heading in page_headings]),
+        "links": [link for *_, page_links in pages for link in page_links],
+        "extraction": extraction,
+        "normalization": normalization,
+    }
+
+
+async def _normalize(pages: list[str]) -> tuple[str, dict]:
+    """The text of the pages, cleaned up in the pool when NORMALIZE_TEXT is on (see app/normalize.py)."""
+    if not config.NORMALIZE_TEXT:
+        return "".join(pages), {}
+    with timed("normalization"):
+        return await _run(normalize_pages, pages)
+
+
+def _heading_lines(headings: list[str]) -> list[str]:
+    # Spaced like the normalized text lines, so the segmenter can match them
+    if not config.NORMALIZE_TEXT:
+        return headings
+    return [" ".join(heading.split()) for heading in headings]
+
+
+async def _extract(data: bytes, file_type: str) -> dict:
+    if file_type == "pdf":
+        return await _extract_pdf(data)
+    if file_type != "docx":
+        raise ValueError("Unsupported file type")
+    text, headings, links = await _run(
+        extract_docx, data, config.SEGMENT_LAYOUT_HINTS, config.CONTACT_FAST_PATH,
+        config.NORMALIZE_TEXT and config.NORMALIZE_TABLES,
+    )
+    text, normalization = await _normalize([text])
+    if config.EXTRACT_MAX_CHARS:
+        text = text[:config.EXTRACT_MAX_CHARS]
+    return {
+        "text": text,
+        "headings": _heading_lines(headings),
+        "links": links,
+        "extraction": {},
+        "normalization": normalization,
+    }
+
+
+async def extract_document_async(data: bytes, file_type: str) -> dict:
+    """
+    Extract the text in the worker pool so large documents do not block the
+    event loop. Returns the text, the heading lines found from the layout,
+    link targets, extraction stats and what normalization removed. Raises asyncio.TimeoutError when
+    a job runs in a worker for more than EXTRACT_TIMEOUT_SECONDS.
+    """
+    start = time.perf_counter()
+    document = await _extract(data, file_type)
+    document["extraction"]["extraction_seconds"] = round(time.perf_counter() - start, 4)
+    return document
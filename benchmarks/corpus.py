@@ -0,0 +1,79 @@
+"""Synthetic PDF/DOCX resumes of varying size for the benchmarks."""
+import io
+import random
+
+import docx
+import fitz  # PyMuPDF
+
+
+FIRST_NAMES = ["Jane", "John", "Priya", "Wei", "Maria", "Ahmed", "Olga", "Kenji"]
+LAST_NAMES = ["Doe", "Smith", "Sharma", "Chen", "Garcia", "Hassan", "Ivanova", "Tanaka"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries"]
+SKILLS = ["Python", "SQL", "Docker", "Kubernetes", "React", "Go", "Terraform", "Spark"]
+
+
+def resume_lines(rng: random.Random, jobs: int) -> list[str]:
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        name,
+        f"{name.lower().replace(' ', '.')}@example.com | +1 555 010{rng.randint(0, 9)}",
+        "linkedin.com/in/" + name.lower().replace(" ", ""),
+        "",
+        "Summary",
+        "Engineer with experience building backend services and data pipelines.",
+        "",
+        "Experience",
+    ]
+    for i in range(jobs):
+        lines += [
+            f"Software Engineer, {rng.choice(COMPANIES)} ({2000 + i} - {2001 + i})",
+            f"- Built services in {rng.choice(SKILLS)} and {rng.choice(SKILLS)} serving {rng.randint(1, 99)}M requests a day.",
+            f"- Led a team of {rng.randint(2, 9)} engineers and cut infrastructure cost by {rng.randint(5, 40)}%.",
+            "",
+        ]
+    lines += [
+        "Education",
+        "BSc Computer Science, State University (2004 - 2008)",
+        "",
+        "Skills",
+        ", ".join(rng.sample(SKILLS, 5)),
+        "",
+        "Certifications",
+        "AWS Solutions Architect (2019)",
+        "",
+        "Languages",
+        "English (fluent), Spanish (intermediate)",
+    ]
+    return lines
+
+
+def make_pdf(lines: list[str], lines_per_page: int = 45) -> bytes:
+    doc = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((50, 50), "\n".join(lines[start:start + lines_per_page]), fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(lines: list[str]) -> bytes:
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_corpus(size: int, seed: int = 0, max_jobs: int = 60) -> list[tuple[str, bytes]]:
+    """(filename, bytes) of size resumes, alternating PDF and DOCX, from 1 to max_jobs jobs long."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        lines = resume_lines(rng, jobs=rng.randint(1, max_jobs))
+        if i % 2 == 0:
+            corpus.append((f"resume_{i}.pdf", make_pdf(lines)))
+        else:
+            corpus.append((f"resume_{i}.docx", make_docx(lines)))
+    return corpus
@@ -0,0 +1,175 @@
+"""
+Offline load benchmark. Drives the /parse-* endpoints in-process with the
+fake LLM (app/fake_llm.py) and a synthetic resume corpus, so it needs no
+OpenAI key and has no network jitter.
+
+    python -m benchmarks.load --requests 300 --concurrency 30 --latency 0.5
+
+Exits with status 1 when a --max-p95 or --min-rps gate is not met, so it
+can gate releases in CI.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+
+ENDPOINTS = ["/parse-resume", "/parse-second-priority", "/parse-third-priority"]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=120, help="total requests")
+    parser.add_argument("--concurrency", type=int, default=12, help="requests in flight")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated endpoints")
+    parser.add_argument("--corpus", type=int, default=24, help="number of distinct resumes")
+    parser.add_argument("--max-jobs", type=int, default=60, help="max jobs per resume, controls document size")
+    parser.add_argument("--latency", type=float, default=0.5, help="mean fake LLM seconds per call")
+    parser.add_argument("--small-latency", type=float, default=0.2, help="mean seconds per call of the fake small model")
+    parser.add_argument("--jitter", type=float, default=0.25, help="relative fake LLM latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of failing fake LLM calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the result cache on")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p95", type=float, help="fail when the overall p95 latency (s) is higher")
+    parser.add_argument("--min-rps", type=float, help="fail when requests/sec is lower")
+    return parser.parse_args(argv)
+
+
+def configure(args: argparse.Namespace) -> None:
+    # Must run before app is imported, app.config reads the environment once
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LLM_SMALL_LATENCY"] = str(args.small_latency)
+    os.environ["FAKE_LLM_JITTER"] = str(args.jitter)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    if not args.cache:
+        os.environ["CACHE_BACKEND"] = "none"
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "max": round(max(latencies, default=0.0), 4),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KB on Linux; children are the extraction worker processes
+    return {
+        "server": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app import config, workers
+    from app.llm import MODEL_NAME, get_llm
+    from app.main import app
+    from benchmarks.corpus import build_corpus
+
+    endpoints = args.endpoints.split(",")
+    corpus = build_corpus(args.corpus, seed=args.seed, max_jobs=args.max_jobs)
+    workers.warm_up()
+    # The large model and the small one of the routed sections
+    llms = {name: get_llm(name) for name in {MODEL_NAME, config.LLM_SMALL_MODEL} if name}
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+        async def one(i: int) -> tuple[str, int, float, float]:
+            filename, data = corpus[i % len(corpus)]
+            endpoint = endpoints[i % len(endpoints)]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(endpoint, files={"file": (filename, data)})
+                elapsed = time.perf_counter() - start
+            extraction = 0.0
+            if response.status_code == 200:
+                extraction = response.json()["meta"].get("extraction", {}).get("extraction_seconds", 0.0)
+            return endpoint, response.status_code, elapsed, extraction
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall = time.perf_counter() - start
+
+    # Worker processes only count towards RUSAGE_CHILDREN once they exit
+    workers.get_pool().shutdown(wait=True)
+
+    ok = [result for result in results if result[1] == 200]
+    # Turned away by admission control
+    rejected = [result for result in results if result[1] in (429, 503)]
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": len(results) - len(ok) - len(rejected),
+        "rejected": len(rejected),
+        "rejected_by_endpoint": {endpoint: sum(1 for e, *_ in rejected if e == endpoint) for endpoint in endpoints},
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(ok) / wall, 2) if wall else 0.0,
+        "latency_seconds": latency_summary([elapsed for _, _, elapsed, _ in ok]),
+        "latency_by_endpoint": {
+            endpoint: latency_summary([elapsed for e, _, elapsed, _ in ok if e == endpoint])
+            for endpoint in endpoints
+        },
+        # Time spent per request, summed over its sections for the LLM
+        "extraction_seconds_per_request": round(sum(e for *_, e in ok) / len(ok), 4) if ok else 0.0,
+        "llm_seconds_per_request": round(sum(llm.busy_seconds for llm in llms.values()) / len(results), 4) if results else 0.0,
+        "llm_calls": sum(llm.calls for llm in llms.values()),
+        "llm_calls_by_model": {name: llm.calls for name, llm in llms.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency_seconds"]
+    print(f"requests      {report['requests']} at concurrency {report['concurrency']}, "
+          f"{report['errors']} errors, {report['rejected']} rejected (429/503)")
+    print(f"throughput    {report['requests_per_second']} req/s over {report['wall_seconds']} s")
+    print(f"latency (s)   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    for endpoint, summary in report["latency_by_endpoint"].items():
+        print(f"  {endpoint:<26} p50 {summary['p50']}  p95 {summary['p95']}  p99 {summary['p99']}")
+    print(f"per request   extraction {report['extraction_seconds_per_request']} s, "
+          f"LLM {report['llm_seconds_per_request']} s ({report['llm_calls']} LLM calls)")
+    print(f"peak RSS (MB) server {report['peak_rss_mb']['server']}, workers {report['peak_rss_mb']['workers']}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure(args)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failed = []
+    if args.max_p95 is not None and report["latency_seconds"]["p95"] > args.max_p95:
+        failed.append(f"p95 {report['latency_seconds']['p95']}s > {args.max_p95}s")
+    if args.min_rps is not None and report["requests_per_second"] < args.min_rps:
+        failed.append(f"{report['requests_per_second']} req/s < {args.min_rps} req/s")
+    for reason in failed:
+        print(f"FAILED: {reason}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Local stand-in for the OpenAI chat completions API with a rate limit, to
+try the client layer (app/llm_client.py) against 429s without a key:
+
+    python -m benchmarks.mock_openai --port 8001 --tpm 60000 --max-concurrency 8
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+
+Answers with the canned JSON of app/fake_llm.py, shaped to the JSON schema
+of structured output requests. Requests over the tokens
+per minute or concurrency quota get a 429 with a Retry-After header.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.fake_llm import fake_response, fake_structured_response
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.25, help="relative latency jitter")
+    parser.add_argument("--tpm", type=int, default=0, help="prompt tokens per minute quota (0 = none)")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests in flight quota (0 = none)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def create_app(latency=0.5, jitter=0.25, tpm=0, max_concurrency=0, error_rate=0.0, seed=0) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    # (time, tokens) of the requests of the last minute
+    window: deque = deque()
+    state = {"in_flight": 0, "requests": 0, "rate_limited": 0, "errors": 0}
+
+    def used_tokens(now: float) -> int:
+        while window and window[0][0] <= now - 60:
+            window.popleft()
+        return sum(tokens for _, tokens in window)
+
+    @app.get("/stats")
+    async def stats():
+        return {**state, "tokens_last_minute": used_tokens(time.monotonic())}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        prompt_tokens = len(prompt) // 4
+        now = time.monotonic()
+        state["requests"] += 1
+
+        if tpm and used_tokens(now) + prompt_tokens > tpm:
+            state["rate_limited"] += 1
+            retry = 60 - (now - window[0][0]) if window else 1.0
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached for tokens per min", "type": "tokens", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after-ms": str(int(retry * 1000))},
+            )
+        if max_concurrency and state["in_flight"] >= max_concurrency:
+            state["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Too many concurrent requests", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+        window.append((now, prompt_tokens))
+
+        state["in_flight"] += 1
+        try:
+            await asyncio.sleep(max(0.0, rng.gauss(latency, jitter * latency)))
+        finally:
+            state["in_flight"] -= 1
+        if rng.random() < error_rate:
+            state["errors"] += 1
+            return JSONResponse({"error": {"message": "Mock server error", "type": "server_error"}}, status_code=500)
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            # Structured output (STRUCTURED_OUTPUT_SECTIONS)
+            content = json.dumps(fake_structured_response(prompt, response_format["json_schema"]["schema"]))
+        else:
+            content = json.dumps(fake_response(prompt))
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-mock-{state['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    args = parse_args(argv)
+    app = create_app(args.latency, args.jitter, args.tpm, args.max_concurrency, args.error_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
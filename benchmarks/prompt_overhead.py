@@ -0,0 +1,61 @@
+"""
+Per-call prompt overhead before and after the prompt registry.
+
+Only the work done before the request is sent to OpenAI is measured, no
+LLM is called.
+
+    python -m benchmarks.prompt_overhead
+"""
+import os
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.prompts import PromptTemplate  # noqa: E402
+
+from app.llm import SECTIONS, get_llm  # noqa: E402
+
+
+RESUME_TEXT = "Jane Doe\nSoftware Engineer\n" + "Built data pipelines in Python and SQL.\n" * 400
+NUMBER = 2000
+
+
+def old_skills_call():
+    # What extract_skills did on every call before the registry
+    skills_parser = SECTIONS["skills"].parser
+    full_prompt = PromptTemplate(
+        template="{format_instructions}\n\n{resume_text}",
+        input_variables=["resume_text"],
+        partial_variables={"format_instructions": skills_parser.get_format_instructions()}
+    )
+    chain = full_prompt | get_llm() | skills_parser
+    return chain.first.invoke({"resume_text": RESUME_TEXT})
+
+
+def old_section_call(section):
+    # PromptTemplate renders the format instructions again on every call
+    return section.prompt.invoke({"resume_text": RESUME_TEXT})
+
+
+def new_section_call(section):
+    return section.render({"resume_text": RESUME_TEXT})
+
+
+def per_call_us(func, *args) -> float:
+    return timeit.timeit(lambda: func(*args), number=NUMBER) / NUMBER * 1_000_000
+
+
+def main():
+    assert new_section_call(SECTIONS["skills"]) == old_skills_call().to_string()
+
+    print(f"{'section':<16}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    rows = [("skills", per_call_us(old_skills_call), per_call_us(new_section_call, SECTIONS["skills"]))]
+    for name, section in SECTIONS.items():
+        if name != "skills":
+            rows.append((name, per_call_us(old_section_call, section), per_call_us(new_section_call, section)))
+    for name, before, after in rows:
+        print(f"{name:<16}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Cold start benchmark. Imports app.main in fresh interpreters with
+python -X importtime and reports the import time of the app modules and of
+the heaviest packages, then the time until the background warm-up is done
+(GET /ready answers 200). No LLM is called.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --backend fake --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+READY_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app, warm_up_state
+imported = time.perf_counter() - start
+
+async def main():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter() - start
+        await app.state.warm_up
+        ready = time.perf_counter() - start
+    return started, ready
+
+started, ready = asyncio.run(main())
+print(json.dumps({"import": imported, "startup": started, "ready": ready, "warm_up": warm_up_state["seconds"]}))
+"""
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement, the median is reported")
+    parser.add_argument("--backend", choices=["openai", "fake"], default="openai", help="LLM_BACKEND of the app")
+    parser.add_argument("--top", type=int, default=10, help="heaviest third-party packages to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def environment(args: argparse.Namespace, tmp: str) -> dict:
+    env = dict(os.environ)
+    env["LLM_BACKEND"] = args.backend
+    # ChatOpenAI wants a key to be built, nothing is sent
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["JOBS_DB_PATH"] = os.path.join(tmp, "jobs.sqlite3")
+    env["CACHE_BACKEND"] = "none"
+    return env
+
+
+def import_times(env: dict) -> dict[str, float]:
+    """Cumulative import seconds per module of one `import app.main`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only the first import of a module costs anything
+        times.setdefault(name.strip(), int(cumulative) / 1_000_000)
+    return times
+
+
+def ready_times(env: dict) -> dict[str, float]:
+    result = subprocess.run([sys.executable, "-c", READY_SCRIPT], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_by_key(runs: list[dict]) -> dict[str, float]:
+    keys = set().union(*runs)
+    return {key: round(statistics.median(run.get(key, 0.0) for run in runs), 4) for key in keys}
+
+
+def run(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = environment(args, tmp)
+        imports = median_by_key([import_times(env) for _ in range(args.runs)])
+        ready = median_by_key([ready_times(env) for _ in range(args.runs)])
+
+    app_modules = {name: seconds for name, seconds in imports.items() if name == "app" or name.startswith("app.")}
+    packages = {
+        name: seconds for name, seconds in imports.items()
+        if "." not in name and not name.startswith("_") and name != "app" and name not in sys.stdlib_module_names
+    }
+    return {
+        "backend": args.backend,
+        "runs": args.runs,
+        "import_seconds": imports.get("app.main", 0.0),
+        "app_modules": dict(sorted(app_modules.items(), key=lambda item: -item[1])),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])[:args.top]),
+        # From the interpreter importing app.main to the end of startup and of the warm-up
+        "startup_seconds": ready["startup"],
+        "ready_seconds": ready["ready"],
+        "warm_up_seconds": ready["warm_up"],
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"import app.main  {report['import_seconds']} s (median of {report['runs']}, {report['backend']} backend)")
+    print(f"startup done     {report['startup_seconds']} s")
+    print(f"ready            {report['ready_seconds']} s (warm-up {report['warm_up_seconds']} s)")
+    print("app modules (cumulative s)")
+    for name, seconds in report["app_modules"].items():
+        print(f"  {name:<24}{seconds:>8.4f}")
+    print("heaviest packages (cumulative s)")
+    for name, seconds in report["packages"].items():
+        print(f"  {name:<24}{seconds:>8.4f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+import pytest
+
+from app import config
+from app.ingest import UploadError
+from app.jobs import expand_upload
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _pdf(size: int) -> bytes:
+    return b"%PDF-1.4\n" + b"\0" * size
+
+
+def test_zip_unpacking_past_the_batch_limit_is_rejected_before_reading(monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_MAX_BYTES", 0)
+    # 30 members of 4 MB of zeros pack to a few hundred KB
+    data = _zip({f"resume_{i}.pdf": _pdf(4 * 1024 * 1024) for i in range(30)})
+    assert len(data) < 1024 * 1024
+
+    def read(*args, **kwargs):
+        raise AssertionError("a member was unpacked")
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", read)
+    with pytest.raises(UploadError) as error:
+        expand_upload("bomb.zip", data, max_bytes=50 * 1024 * 1024)
+    assert error.value.status_code == 413
+
+
+def test_zip_with_too_many_members_is_rejected():
+    data = _zip({f"resume_{i}.pdf": _pdf(10) for i in range(11)})
+    with pytest.raises(UploadError) as error:
+        expand_upload("many.zip", data, max_files=10)
+    assert error.value.status_code == 413
+
+
+def test_zip_within_the_limits_is_expanded():
+    data = _zip({"a.pdf": _pdf(10), "b.pdf": _pdf(10), "notes.txt": b"hello"})
+    files = expand_upload("ok.zip", data, max_bytes=1024, max_files=3)
+    assert [(name, file_type) for name, file_type, _ in files] == [("a.pdf", "pdf"), ("b.pdf", "pdf")]
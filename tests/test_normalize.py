@@ -0,0 +1,28 @@
+from app.normalize import normalize_pages
+
+
+def test_line_repeated_on_two_pages_is_kept():
+    page_1 = "Jane Doe\njane@example.com\n\nExperience\nAcme Corp\nSoftware Engineer\n"
+    page_2 = "Software Engineer\nGlobex\n2019 - 2021\nBuilt the billing system\n"
+    text, stats = normalize_pages([page_1, page_2])
+    assert text.count("Software Engineer") == 2
+    assert stats["repeated_lines_removed"] == 0
+
+
+def test_footer_on_every_page_is_kept_once():
+    pages = [
+        f"Jane Doe\nSection {i}\nLine {i} of content\nMore content\nJane Doe - Resume\n{i}\n"
+        for i in range(1, 4)
+    ]
+    text, stats = normalize_pages(pages)
+    assert text.count("Jane Doe - Resume") == 1
+    assert stats["page_numbers_removed"] == 3
+
+
+def test_footer_text_at_the_top_of_a_page_is_kept():
+    pages = [f"Jane Doe\nRole {i}\nBuilt things {i}\nTeam Lead\n" for i in range(1, 4)]
+    pages.append("Team Lead\nInitech\n2015 - 2017\nMaintained things\n")
+    text, _ = normalize_pages(pages)
+    # A footer of the first three pages, but content at the top of the fourth
+    assert text.count("Team Lead") == 2
+    assert "Team Lead\nInitech" in text
@@ -0,0 +1,30 @@
+import asyncio
+
+import fitz
+
+from app import config, workers
+
+
+def _pdf(pages: int, chars_per_page: int) -> bytes:
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        line = f"Page {number + 1} experience entry with some words "
+        text = "\n".join(line for _ in range(chars_per_page // len(line)))
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=6)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_pdf_cut_by_the_character_budget_is_reported_truncated(monkeypatch):
+    monkeypatch.setattr(config, "EXTRACT_POOL", "thread")
+    monkeypatch.setattr(config, "EXTRACT_MAX_CHARS", 3000)
+    monkeypatch.setattr(config, "EXTRACT_TIMEOUT_SECONDS", 0)
+    monkeypatch.setattr(workers, "_pool", None)
+    document = asyncio.run(workers.extract_document_async(_pdf(10, 1000), "pdf"))
+    workers.shutdown()
+    extraction = document["extraction"]
+    assert extraction["pages"] < extraction["pages_total"] == 10
+    assert extraction["truncated"] is True
+    assert len(document["text"]) <= 3000